@@ -0,0 +1,101 @@
+"""
+Per phase benchmark for ccgen.
+
+Generates code for the synthetic schemas of benchmarks/synthetic.py, and
+measures the phases of a run separately:
+
+  load     parsing the YAML file
+  resolve  building the Schema, with its resolved types, and the CQL and
+           Java generators from it
+  render   rendering all templates (with compiled templates in memory)
+  write    writing the generated files
+
+Prints the median time in milliseconds per profile and phase as JSON, along
+with the number of generated files and bytes, so that results of different
+versions can be compared.
+
+Usage: python benchmarks/phases.py [--runs N] [--scale N] [PROFILE ...]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+from ccgen import ccgen
+from ccgen.cql import CqlGenerator
+from ccgen.java import JavaGenerator
+from ccgen.schema import Schema
+
+def _timed(timings, phase, function):
+    start = time.perf_counter()
+    result = function()
+    timings.setdefault(phase, []).append((time.perf_counter() - start) * 1000)
+    return result
+
+def _run(yaml_file, output_dir, timings):
+    config = _timed(timings, 'load', lambda: Schema.read_config(yaml_file))
+
+    def resolve():
+        schema = Schema(config)
+        return [CqlGenerator(schema, output_dir, 'create-tables.cql'), JavaGenerator(schema, output_dir)]
+    generators = _timed(timings, 'resolve', resolve)
+    outputs = _timed(timings, 'render', lambda: [output for generator in generators for output in ccgen._render(ccgen._env(), generator)])
+
+    def write():
+        for f, contents in outputs:
+            ccgen._write_file(f.name, f.directory, contents)
+    _timed(timings, 'write', write)
+
+    shutil.rmtree(output_dir)
+    return outputs
+
+def benchmark(profile, scale, runs, work_dir):
+    yaml_file = os.path.join(work_dir, '%s.yaml' % profile)
+    synthetic.write(profile, yaml_file, scale)
+
+    output_dir = os.path.join(work_dir, 'out')
+    timings = {}
+    # The first run compiles the templates, which is not part of any phase.
+    outputs = _run(yaml_file, output_dir, {})
+    for _ in range(runs):
+        _run(yaml_file, output_dir, timings)
+
+    result = { phase: round(statistics.median(values), 1) for phase, values in timings.items() }
+    result['total'] = round(sum(result.values()), 1)
+    return {
+        'median': result,
+        'files': len(outputs),
+        'bytes': sum(len(contents.encode('utf-8')) for _, contents in outputs),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the phases of ccgen code generation.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('profiles', metavar='PROFILE', nargs='*', help='One of %s (default: all).' % ', '.join(sorted(synthetic.PROFILES)))
+    args = parser.parse_args()
+
+    unknown = [profile for profile in args.profiles if profile not in synthetic.PROFILES]
+    if unknown:
+        parser.error('unknown profiles: %s' % ', '.join(unknown))
+    profiles = args.profiles or sorted(synthetic.PROFILES)
+
+    work_dir = tempfile.mkdtemp()
+    os.environ.setdefault('CCGEN_CACHE_DIR', os.path.join(work_dir, 'cache'))
+    try:
+        results = { profile: benchmark(profile, args.scale, args.runs, work_dir) for profile in profiles }
+    finally:
+        shutil.rmtree(work_dir)
+
+    print(json.dumps({ 'unit': 'ms', 'runs': args.runs, 'scale': args.scale, 'profiles': results }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Startup benchmark for the ccgen command line tool.
+
+Measures wall clock time of complete ccgen processes for the scenarios that
+build hooks run most often: printing help, an incremental run where nothing
+changed and a full run with a warm template cache. Prints the median time in
+milliseconds per scenario as JSON.
+
+Usage: python benchmarks/startup.py [--runs N] [YAML_FILE]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_YAML = os.path.join(ROOT, 'tests', 'tables.yaml')
+
+def _ccgen(*args):
+    return [sys.executable, '-c', 'from ccgen.ccgen import _main; _main()'] + list(args)
+
+def _time(command, env, runs, before=None):
+    timings = []
+    for _ in range(runs):
+        if before:
+            before()
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure ccgen startup time.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('yaml_file', nargs='?', default=DEFAULT_YAML)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    output_dir = os.path.join(work_dir, 'out')
+    env = dict(os.environ, PYTHONPATH=ROOT, CCGEN_CACHE_DIR=os.path.join(work_dir, 'cache'))
+    generate = _ccgen('--java', output_dir, '--cql', os.path.join(output_dir, 'create-tables.cql'), args.yaml_file)
+    incremental = _ccgen('--manifest', os.path.join(work_dir, 'manifest.json'), '--java', output_dir, '--cql', os.path.join(output_dir, 'create-tables.cql'), args.yaml_file)
+
+    try:
+        subprocess.run(incremental, env=env, check=True)
+        results = {
+            'python': _time([sys.executable, '-c', 'pass'], env, args.runs),
+            'help': _time(_ccgen('--help'), env, args.runs),
+            'incremental_no_op': _time(incremental, env, args.runs),
+            'full': _time(generate, env, args.runs, lambda: shutil.rmtree(output_dir, ignore_errors=True)),
+        }
+    finally:
+        shutil.rmtree(work_dir)
+
+    print(json.dumps({ 'unit': 'ms', 'median': results }, indent=2))
+
+if __name__ == '__main__':
+    main()
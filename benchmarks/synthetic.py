@@ -0,0 +1,133 @@
+"""
+Synthetic schema generator for benchmarks.
+
+Writes YAML schemas that stress different parts of ccgen:
+
+  many_tables         thousands of small tables
+  wide_tables         a few tables with hundreds of columns each
+  deep_types          a long chain of user defined types, each nesting the previous one
+  nested_collections  tables with collections of collections of user defined types
+
+Usage: python benchmarks/synthetic.py [--scale N] PROFILE OUTPUT_FILE
+"""
+import sys
+import argparse
+
+SIMPLE_TYPES = ['ascii', 'bigint', 'blob', 'boolean', 'decimal', 'double', 'float', 'inet',
+                'int', 'text', 'timestamp', 'timeuuid', 'uuid', 'varchar', 'varint']
+
+def _header(lines):
+    lines.extend([
+        '---',
+        'options:',
+        '  package: com.example.synthetic',
+        '  keyspace: synthetic',
+    ])
+
+def _table(lines, name, fields, partition_key, clustering=()):
+    lines.append('  %s:' % name)
+    lines.append('    fields:')
+    for field_name, type_lines in fields:
+        if isinstance(type_lines, str):
+            lines.append('      %s: %s' % (field_name, type_lines))
+        else:
+            lines.append('      %s:' % field_name)
+            lines.extend('        ' + line for line in type_lines)
+    lines.append('    partition_key:')
+    lines.extend('      - %s' % key for key in partition_key)
+    if clustering:
+        lines.append('    clustering:')
+        lines.extend('      %s: asc' % key for key in clustering)
+
+def _simple_fields(count):
+    return [('%s_%d' % (SIMPLE_TYPES[i % len(SIMPLE_TYPES)], i), SIMPLE_TYPES[i % len(SIMPLE_TYPES)]) for i in range(count)]
+
+def many_tables(scale):
+    """scale * 1000 tables of 12 columns."""
+    lines = []
+    _header(lines)
+    lines.append('tables:')
+    for i in range(scale * 1000):
+        fields = _simple_fields(12)
+        _table(lines, 'table_%d' % i, fields, [fields[0][0]], [fields[1][0]])
+    return lines
+
+def wide_tables(scale):
+    """scale * 10 tables of 500 columns."""
+    lines = []
+    _header(lines)
+    lines.append('tables:')
+    for i in range(scale * 10):
+        fields = _simple_fields(500)
+        _table(lines, 'wide_table_%d' % i, fields, [fields[0][0], fields[1][0]], [fields[2][0], fields[3][0]])
+    return lines
+
+def deep_types(scale):
+    """A chain of scale * 50 user defined types, and a table using the last one."""
+    depth = scale * 50
+    lines = []
+    _header(lines)
+    lines.append('types:')
+    for i in range(depth):
+        lines.append('  type_%d:' % i)
+        lines.append('    name: varchar')
+        lines.append('    value: bigint')
+        if i > 0:
+            lines.append('    parent: type_%d' % (i - 1))
+    lines.append('tables:')
+    _table(lines, 'deep_table', [('pk', 'varchar'), ('deepest', 'type_%d' % (depth - 1))], ['pk'])
+    return lines
+
+def _nested_collection(level):
+    """A collection type nested level levels deep, with a user defined type at the bottom."""
+    if level == 0:
+        return 'leaf_type'
+    nested = _nested_collection(level - 1)
+    if isinstance(nested, str):
+        nested = ['type: %s' % nested]
+    if level % 3 == 1:
+        return ['type: list', 'entries:'] + ['  ' + line for line in nested]
+    elif level % 3 == 2:
+        return ['type: set', 'entries:'] + ['  ' + line for line in nested]
+    else:
+        return ['type: map', 'keys: varchar', 'values:'] + ['  ' + line for line in nested]
+
+def nested_collections(scale):
+    """scale * 100 tables with collections nested up to five levels deep."""
+    lines = []
+    _header(lines)
+    lines.append('types:')
+    lines.append('  leaf_type:')
+    lines.append('    name: varchar')
+    lines.append('    tags:')
+    lines.append('      type: set')
+    lines.append('      entries: varchar')
+    lines.append('tables:')
+    for i in range(scale * 100):
+        fields = [('pk', 'varchar')] + [('nested_%d' % level, _nested_collection(level)) for level in range(1, 6)]
+        _table(lines, 'collection_table_%d' % i, fields, ['pk'])
+    return lines
+
+PROFILES = {
+    'many_tables': many_tables,
+    'wide_tables': wide_tables,
+    'deep_types': deep_types,
+    'nested_collections': nested_collections,
+}
+
+def write(profile, output_file, scale=1):
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(PROFILES[profile](scale)))
+        f.write('\n')
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic ccgen schema.')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('profile', choices=sorted(PROFILES))
+    parser.add_argument('output_file')
+    args = parser.parse_args()
+
+    write(args.profile, args.output_file, args.scale)
+
+if __name__ == '__main__':
+    main()
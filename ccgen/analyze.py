@@ -0,0 +1,203 @@
+import sys
+import argparse
+
+from .cql import CqlGenerator, MapType, OneDimensionalContainerType, UserDefinedType
+from .schema import Schema
+
+# Average sizes in bytes of values of the CQL types, for columns without a
+# size hint. Variable length types get a guess that is meant to be
+# overridden by the sizing section of the table.
+TYPE_SIZES = {
+    'ascii': 32, 'bigint': 8, 'blob': 256, 'boolean': 1, 'counter': 8, 'date': 4, 'decimal': 16, 'double': 8,
+    'duration': 16, 'float': 4, 'inet': 16, 'int': 4, 'smallint': 2, 'text': 32, 'time': 8, 'timestamp': 8,
+    'timeuuid': 16, 'tinyint': 1, 'uuid': 16, 'varchar': 32, 'varint': 16}
+
+# Average number of entries of collections without an entries hint.
+COLLECTION_ENTRIES = 10
+
+# Every cell is stored with its write timestamp.
+CELL_OVERHEAD = 8
+
+# Tables with this many clustering columns, and no TTL, tend to grow
+# partitions without bound.
+MANY_CLUSTERING_COLUMNS = 3
+
+MEGABYTE = 1024 * 1024
+
+class Finding():
+    def __init__(self, severity, message):
+        self.severity = severity
+        self.message = message
+
+    @property
+    def is_error(self):
+        return self.severity == 'error'
+
+class TableAnalysis():
+    """
+    The estimated partition size of a table, and the problems found in its
+    data model. Estimates follow the usual formulas for Cassandra partitions:
+
+        cells = rows * regular cells per row
+        size  = partition key + rows * (clustering key + regular columns) + cells * 8
+
+    where collections have a cell per entry, and each cell carries an 8 byte
+    timestamp. The number of rows per partition is None when it is unknown.
+    """
+    def __init__(self, name, rows, cells, size):
+        self.name = name
+        self.rows = rows
+        self.cells = cells
+        self.size = size
+        self.findings = []
+
+    def warn(self, message):
+        self.findings.append(Finding('warning', message))
+
+    def fail(self, message):
+        self.findings.append(Finding('error', message))
+
+    @property
+    def has_errors(self):
+        return any(finding.is_error for finding in self.findings)
+
+class Analyzer():
+    """
+    Estimates partition sizes from the CQL definitions of a schema and the
+    sizing hints of its tables, and lints the tables for data model
+    anti-patterns. Partitions over max_size bytes or max_cells cells are
+    errors, everything else is a warning.
+    """
+    def __init__(self, schema, max_size=100 * MEGABYTE, max_cells=100000):
+        self.schema = schema
+        self.max_size = max_size
+        self.max_cells = max_cells
+
+        cql = CqlGenerator(schema, '.', 'create-tables.cql')
+        self.types = { type_def.name: type_def for type_def in cql.cql_types }
+        self.tables = [self._analyze(table_def, schema.tables[table_def.name]) for table_def in cql.cql_tables]
+
+    @property
+    def has_errors(self):
+        return any(table.has_errors for table in self.tables)
+
+    def _analyze(self, table_def, table):
+        sizes = table.sizing.sizes
+        entries = table.sizing.entries
+
+        clustering_key = [clustering.field_name for clustering in table_def.clustering]
+        rows = table.sizing.rows_per_partition
+        if rows is None and not clustering_key:
+            rows = 1
+
+        def size_of(field):
+            if field.name in sizes:
+                return sizes[field.name]
+            return self._size(field.cql_type, entries.get(field.name, COLLECTION_ENTRIES))
+
+        def cells_of(field):
+            if isinstance(field.cql_type, (OneDimensionalContainerType, MapType)):
+                return entries.get(field.name, COLLECTION_ENTRIES)
+            return 1
+
+        partition_key = [field for field in table_def.fields if field.name in table_def.partition_key]
+        clustering = [field for field in table_def.fields if field.name in clustering_key]
+        regular = [field for field in table_def.fields if field.name not in table_def.partition_key and field.name not in clustering_key]
+
+        if rows is None:
+            result = TableAnalysis(table_def.name, None, None, None)
+        else:
+            cells = rows * sum(cells_of(field) for field in regular)
+            size = (sum(size_of(field) for field in partition_key)
+                    + rows * (sum(size_of(field) for field in clustering) + sum(size_of(field) for field in regular))
+                    + cells * CELL_OVERHEAD)
+            result = TableAnalysis(table_def.name, rows, cells, size)
+
+        ttl = dict(table.options).get('default_time_to_live')
+        if ttl is not None and type(ttl) != int:
+            result.warn("The default_time_to_live %r is not a number of seconds, Cassandra will reject it." % (ttl,))
+        has_ttl = type(ttl) == int and ttl > 0
+
+        if rows is None:
+            result.warn(
+                "Partitions are unbounded: the table has clustering columns but no rows_per_partition hint. "
+                "Bound partitions with a bucket (e.g. a day) in the partition key, and add the hint.")
+        if result.size is not None and result.size > self.max_size:
+            result.fail("Partitions of about %s exceed the maximum of %s." % (_format_size(result.size), _format_size(self.max_size)))
+        if result.cells is not None and result.cells > self.max_cells:
+            result.fail("Partitions of about %d cells exceed the maximum of %d." % (result.cells, self.max_cells))
+
+        for field in partition_key + clustering:
+            if isinstance(field.cql_type, (OneDimensionalContainerType, MapType)):
+                result.warn(
+                    "Key column '%s' is a collection of about %s. Key values are stored with every row and index entry, keep them small."
+                    % (field.name, _format_size(size_of(field))))
+        for field in regular:
+            if isinstance(field.cql_type, OneDimensionalContainerType) and field.cql_type.name == 'list':
+                result.warn(
+                    "List column '%s' is replaced as a whole when the row is written, which writes a tombstone every time, "
+                    "and appends to lists are not idempotent. Use a set, or a frozen list." % field.name)
+        if len(clustering) >= MANY_CLUSTERING_COLUMNS and not has_ttl:
+            result.warn(
+                "The table has %d clustering columns and no default_time_to_live, so its partitions only grow." % len(clustering))
+
+        return result
+
+    def _size(self, cql_type, entries):
+        if isinstance(cql_type, UserDefinedType):
+            return sum(self._size(field.cql_type, COLLECTION_ENTRIES) for field in self.types[cql_type.name].fields)
+        elif isinstance(cql_type, OneDimensionalContainerType):
+            return entries * self._size(cql_type.entries, COLLECTION_ENTRIES)
+        elif isinstance(cql_type, MapType):
+            return entries * (self._size(cql_type.keys, COLLECTION_ENTRIES) + self._size(cql_type.values, COLLECTION_ENTRIES))
+        else:
+            return TYPE_SIZES[cql_type.name]
+
+    def report(self):
+        lines = []
+        for table in self.tables:
+            if table.rows is None:
+                lines.append('  %s: unknown number of rows per partition' % table.name)
+            else:
+                lines.append('  %s: %d rows, %d cells, %s per partition' % (table.name, table.rows, table.cells, _format_size(table.size)))
+            for finding in table.findings:
+                lines.append('    %s: %s' % (finding.severity, finding.message))
+        return '\n'.join(lines)
+
+def _format_size(size):
+    for unit in ('bytes', 'KiB', 'MiB'):
+        if size < 1024:
+            return ('%d %s' if unit == 'bytes' else '%.1f %s') % (size, unit)
+        size /= 1024.0
+    return '%.1f GiB' % size
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='ccgen analyze',
+        description='Estimate partition sizes and report data model anti-patterns of YAML descriptions of Cassandra tables.')
+
+    parser.add_argument(
+        '--max-partition-mb', metavar='MB', type=float, required=False, default=100,
+        help="Report an error for tables with partitions of more than this many megabytes (default: 100).")
+    parser.add_argument(
+        '--max-partition-cells', metavar='CELLS', type=int, required=False, default=100000,
+        help="Report an error for tables with partitions of more than this many cells (default: 100000).")
+
+    parser.add_argument(
+        'files', metavar='YAML_FILES', type=str, nargs='+',
+        help="YAML files with table descriptions to analyze.")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    failed = 0
+    for fn in args.files:
+        analyzer = Analyzer(Schema.load(fn), int(args.max_partition_mb * MEGABYTE), args.max_partition_cells)
+        print(fn)
+        print(analyzer.report())
+        failed += sum(1 for table in analyzer.tables if table.has_errors)
+
+    if failed:
+        sys.exit('ccgen: error: %d tables exceed the partition thresholds' % failed)
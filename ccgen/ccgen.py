@@ -1,51 +1,339 @@
 import os
+import sys
+import time
 import argparse
+import functools
+from collections import OrderedDict
 
-from jinja2 import Template, Environment, PackageLoader
+from . import __version__
+from .manifest import Manifest, template_digest
+from .output import write_atomic, write_srcjar
+from .timings import Timings
 
-from .cql import CqlGenerator
-from .java import JavaGenerator
-from .generator import Generator
+# Jinja2, PyYAML and the generators are imported where they are first
+# needed. A run that has nothing to generate (--help, or an incremental
+# run where all inputs are up to date) does not need to pay for them.
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'templates')
+
+# With --srcjar, Java sources are generated into this pseudo directory. Their
+# paths relative to it are the names of the entries in the archive.
+SRCJAR_ROOT = '<srcjar>'
+
+# One template environment per process, so that worker processes
+# compile every template at most once.
+_environment = None
+
+def _cache_dir():
+    return os.environ.get('CCGEN_CACHE_DIR') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+        'ccgen', __version__)
+
+def _bytecode_cache():
+    """
+    Compiled templates are kept in a persistent cache across runs. Jinja2
+    checks the cached code against the checksum of the template source, so
+    edited templates are recompiled. Without a usable cache directory,
+    templates are compiled on every run.
+    """
+    from jinja2 import FileSystemBytecodeCache
+
+    directory = _cache_dir()
+    try:
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+    except OSError:
+        return None
+
+    return FileSystemBytecodeCache(directory) if os.access(directory, os.W_OK) else None
+
+def _env():
+    global _environment
+    if _environment is None:
+        from jinja2 import Environment, FileSystemLoader
+        _environment = Environment(loader=FileSystemLoader(TEMPLATE_DIR), bytecode_cache=_bytecode_cache())
+    return _environment
 
 def _write_file(name, directory, contents):
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-
-    with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
-        f.write(contents)
-
-def _main():
-    args = _parse_args()
-    cql_dir, cql_file = os.path.split(args.cql)
-    java_dir = args.java
-
-    env = Environment(loader=PackageLoader('ccgen','templates'))
-    for fn in args.files:
-        cql_generator = CqlGenerator(fn, cql_dir, cql_file)
-        for f in cql_generator.files:
-            template = env.get_template(f.template)
-            _write_file(f.name, f.directory, template.render(data=f.data, config=cql_generator.config))
-
-        java_generator = JavaGenerator(fn, java_dir)
-        for f in java_generator.files:
-            template = env.get_template(f.template)
-            _write_file(f.name, f.directory, template.render(data=f.data, config=java_generator.config))
-
-def _parse_args():
+    write_atomic(os.path.join(directory, name), contents)
+
+def _render_file(env, generator, f):
+    return env.get_template(f.template).render(data=f.data, config=generator.config)
+
+def _render(env, generator):
+    for f in generator.files:
+        yield f, _render_file(env, generator, f)
+
+def _output_path(pattern, fn):
+    return pattern.format(name=os.path.splitext(os.path.basename(fn))[0])
+
+def _generate(fn, cql, java_dir, timings=None, migrate_from=None, migration=None, snapshot=None, python_dir=None):
+    """
+    Parse, resolve and render a single input file. Returns a list of
+    (path, contents) tuples. Nothing is written to disk here, so this
+    can safely run in a worker process.
+
+    With migrate_from, the migration from that (previous) schema file to
+    the input file is generated into migration as well. With snapshot, the
+    schema is also written to snapshot as JSON, for use as a previous
+    schema file later on. With python_dir, a Python module is generated as
+    well.
+    """
+    from .schema import Schema
+
+    timings = timings if timings is not None else Timings()
+
+    with timings.measure(fn, 'load'):
+        config = Schema.read_config(fn)
+        previous_config = _previous_config(fn, config, migrate_from) if migrate_from else None
+    with timings.measure(fn, 'resolve'):
+        schema = Schema(config)
+        previous = Schema(previous_config) if migrate_from else None
+        generators = _generators(fn, schema, cql, java_dir, previous, migration, python_dir)
+
+    env = _env()
+    outputs = []
+    for generator in generators:
+        for f in generator.files:
+            path = os.path.join(f.directory, f.name)
+            with timings.measure(fn, 'render', path, f.template):
+                outputs.append((path, _render_file(env, generator, f)))
+
+    if snapshot:
+        outputs.append((_output_path(snapshot, fn), _snapshot(schema)))
+
+    return outputs
+
+def _previous_schema(fn, schema, migrate_from):
+    from .schema import Schema
+    return Schema(_previous_config(fn, schema.config, migrate_from))
+
+def _previous_config(fn, config, migrate_from):
+    from .schema import Schema
+
+    previous = _output_path(migrate_from, fn)
+    # Without a previous schema, the migration creates everything.
+    return Schema.read_config(previous) if os.path.exists(previous) else { 'options': config['options'] }
+
+def _generators(fn, schema, cql, java_dir, previous=None, migration=None, python_dir=None):
+    """The generators of all outputs of the schema of input file fn."""
+    from .cql import CqlGenerator
+    from .java import JavaGenerator
+
+    generators = [CqlGenerator(schema, *os.path.split(_output_path(cql, fn))), JavaGenerator(schema, java_dir)]
+    if previous is not None:
+        from .migration import MigrationGenerator
+        generators.append(MigrationGenerator(schema, previous, *os.path.split(_output_path(migration, fn))))
+    if python_dir:
+        from .python import PythonGenerator
+        generators.append(PythonGenerator(schema, python_dir))
+    return generators
+
+def _snapshot(schema):
+    import json
+    return json.dumps(schema.config, indent=2, default=str) + '\n'
+
+def _generate_timed(fn, cql, java_dir, **kwargs):
+    """Like _generate, but also returns the Timings of the input file."""
+    timings = Timings()
+    return _generate(fn, cql, java_dir, timings, **kwargs), timings
+
+def _in_srcjar(path):
+    return path.startswith(SRCJAR_ROOT + os.path.sep)
+
+def _joined_cql(args):
+    """
+    With --srcjar and a single --cql file (without {name}), the CQL of all
+    input files is joined into that file, in the order of the inputs.
+    Returns the path of that file, or None.
+    """
+    return os.path.normpath(args.cql) if args.srcjar and '{name}' not in args.cql else None
+
+def _join_cql(contents):
+    return '\n'.join(contents)
+
+def _conflicts(paths_by_file):
+    """The outputs that are generated more than once, as (path, first input file, input file) tuples."""
+    owners = {}
+    conflicts = []
+    for fn, paths in paths_by_file:
+        for path in paths:
+            key = os.path.normpath(os.path.abspath(path))
+            if key in owners:
+                conflicts.append((path, owners[key], fn))
+            else:
+                owners[key] = fn
+    return conflicts
+
+def _conflicts_message(conflicts):
+    return 'conflicting outputs:\n  %s' % '\n  '.join('%s is generated from both %s and %s' % conflict for conflict in conflicts)
+
+def _check_conflicts(paths_by_file):
+    conflicts = _conflicts(paths_by_file)
+    if conflicts:
+        sys.exit('ccgen: error: %s' % _conflicts_message(conflicts))
+
+def _manifest(args):
+    java = 'srcjar:' + os.path.abspath(args.srcjar) if args.srcjar else os.path.abspath(args.java)
+    python = os.path.abspath(args.python) if args.python else ''
+    snapshot = os.path.abspath(args.snapshot) if args.snapshot else ''
+    fingerprint = '\n'.join([__version__, template_digest(TEMPLATE_DIR), java, os.path.abspath(args.cql), python, snapshot])
+    return Manifest(args.manifest, fingerprint)
+
+def _main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['analyze']:
+        from .analyze import main
+        return main(argv[1:])
+
+    args = _parse_args(argv)
+
+    if args.watch:
+        from .watch import Watcher
+        Watcher(args).run()
+        return
+
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(_run, args)
+        finally:
+            profiler.dump_stats(args.profile)
+    else:
+        _run(args)
+
+def _run(args):
+    start = time.perf_counter()
+    timed = args.timings or args.timings_json
+    timings = Timings()
+    files = list(OrderedDict.fromkeys(os.path.normpath(fn) for fn in args.files))
+
+    manifest = _manifest(args) if args.manifest else None
+
+    pending = [fn for fn in files if not (manifest and manifest.is_up_to_date(fn))]
+    if args.srcjar and (pending or not os.path.exists(args.srcjar) or (_joined_cql(args) and not os.path.exists(args.cql))):
+        # The archive, and the joined CQL, are always written as a whole.
+        pending = files
+    if args.migrate_from:
+        # Migrations also depend on the previous schema files.
+        pending = files
+
+    java_dir = SRCJAR_ROOT if args.srcjar else args.java
+    generate = functools.partial(
+        _generate_timed if timed else _generate,
+        cql=args.cql, java_dir=java_dir, migrate_from=args.migrate_from, migration=args.migration, snapshot=args.snapshot,
+        python_dir=args.python)
+    if args.jobs > 1 and len(pending) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(generate, pending))
+    else:
+        results = [generate(fn) for fn in pending]
+
+    if timed:
+        for _, input_timings in results:
+            timings.merge(input_timings)
+        results = [outputs for outputs, _ in results]
+
+    generated = dict(zip(pending, results))
+    joined_cql = _joined_cql(args)
+    _check_conflicts(
+        (fn, [path for path, _ in generated[fn] if os.path.normpath(path) != joined_cql] if fn in generated else manifest.outputs(fn))
+        for fn in files)
+
+    srcjar_entries = []
+    cql_contents = []
+    for fn in pending:
+        if args.srcjar:
+            files_outputs = [(path, contents) for path, contents in generated[fn] if not _in_srcjar(path) and os.path.normpath(path) != joined_cql]
+            srcjar_entries.extend((os.path.relpath(path, SRCJAR_ROOT), contents) for path, contents in generated[fn] if _in_srcjar(path))
+            cql_contents.extend(contents for path, contents in generated[fn] if os.path.normpath(path) == joined_cql)
+        else:
+            files_outputs = generated[fn]
+
+        for path, contents in files_outputs:
+            with timings.measure(fn, 'write', path):
+                if manifest is None or manifest.needs_write(path, contents):
+                    _write_file(os.path.basename(path), os.path.dirname(path), contents)
+
+        if manifest:
+            for path in manifest.update(fn, dict(files_outputs)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    if args.srcjar and pending:
+        with timings.measure(args.srcjar, 'write', args.srcjar):
+            write_srcjar(args.srcjar, srcjar_entries)
+    if joined_cql and pending:
+        with timings.measure(args.cql, 'write', args.cql):
+            if manifest is None or manifest.needs_write(args.cql, _join_cql(cql_contents)):
+                write_atomic(args.cql, _join_cql(cql_contents))
+
+    if manifest:
+        for path in manifest.retain(files):
+            if os.path.exists(path):
+                os.remove(path)
+        manifest.save()
+
+    if timed:
+        timings.wall = (time.perf_counter() - start) * 1000
+        if args.timings:
+            print(timings.report(), file=sys.stderr)
+        if args.timings_json:
+            with open(args.timings_json, 'w', encoding='utf-8') as f:
+                f.write(timings.to_json())
+
+def _parse_args(argv=None):
     parser = argparse.ArgumentParser(description='Generate CQL DDL and Java POJOs from YAML descriptions of Cassandra tables.')
 
     parser.add_argument(
         '--java', '-j', metavar='JAVA_OUTPUT_DIR', type=str, required=False, default='.',
         help="Output directory for the generated Java source files. Directories for packages will be created underneath if they do not exist.")
+    parser.add_argument(
+        '--srcjar', '-s', metavar='SRCJAR_FILE', type=str, required=False, default=None,
+        help="Write all generated Java source files into this source archive (a zip file, e.g. generated.srcjar) instead of into JAVA_OUTPUT_DIR, and the CQL of all YAML files into CQL_FILE, unless it contains {name}. The archive is replaced as a whole.")
     parser.add_argument(
         '--cql', '-c', metavar='CQL_FILE', type=str, required=False, default='./create-tables.cql',
-        help="File name for the generated CQL file. Fully qualified directory and filename (e.g. src/generated/cql/create-tables.cql)")
+        help="File name for the generated CQL file. Fully qualified directory and filename (e.g. src/generated/cql/create-tables.cql). When passing multiple YAML files, use {name} for the base name of each YAML file (e.g. src/generated/cql/{name}.cql)")
+    parser.add_argument(
+        '--python', '-p', metavar='PYTHON_OUTPUT_DIR', type=str, required=False, default=None,
+        help="Also generate a Python module with row classes for the Python driver into this directory. The module is named after the keyspace, unless the python_module option says otherwise.")
+    parser.add_argument(
+        '--migrate-from', metavar='PREVIOUS_SCHEMA', type=str, required=False, default=None,
+        help="Also generate the CQL that migrates a keyspace from this previous version of the schema (a YAML file, or a snapshot written with --snapshot) to the current one. Use {name} for the base name of each YAML file. Incompatible changes, like changes to a primary key, are reported as errors.")
+    parser.add_argument(
+        '--migration', metavar='MIGRATION_FILE', type=str, required=False, default='./migration.cql',
+        help="File name for the generated migration CQL (see --migrate-from). Use {name} for the base name of each YAML file.")
+    parser.add_argument(
+        '--snapshot', metavar='SNAPSHOT_FILE', type=str, required=False, default=None,
+        help="Write the schema as JSON to this file, for use with --migrate-from in a later run. Use {name} for the base name of each YAML file.")
+    parser.add_argument(
+        '--manifest', '-m', metavar='MANIFEST_FILE', type=str, required=False, default=None,
+        help="Enables incremental generation. Hashes of inputs and outputs are kept in this file; inputs that did not change since the previous run are skipped, unchanged outputs are not rewritten and outputs for removed tables or types are deleted.")
+    parser.add_argument(
+        '--jobs', '-J', metavar='N', type=int, required=False, default=1,
+        help="Number of processes used to parse and render YAML files in parallel. Output is identical to a run with a single process.")
+
+    parser.add_argument(
+        '--watch', '-w', action='store_true',
+        help="Keep running, and regenerate outputs whenever the YAML files or templates change. Only the outputs of changed types and tables, and of the types and tables that use changed types, are rendered again. --manifest and --jobs are not used.")
+
+    parser.add_argument(
+        '--timings', '-t', action='store_true',
+        help="Print the time spent loading, resolving, rendering and writing, per phase and per input file, and the slowest outputs and templates to stderr. With --jobs, phase times are summed over all processes.")
+    parser.add_argument(
+        '--timings-json', metavar='TIMINGS_FILE', type=str, required=False, default=None,
+        help="Write the timings of the run (see --timings) to this file as JSON, including the times of every output file.")
+    parser.add_argument(
+        '--profile', metavar='PROFILE_FILE', type=str, required=False, default=None,
+        help="Run under cProfile and save the stats to this file, for use with pstats or snakeviz. Only the main process is profiled; use --jobs 1 to include parsing and rendering.")
 
     parser.add_argument(
         'files', metavar='YAML_FILES', type=str, nargs='+',
         help="YAML files with table descriptions to parse. Multiple files may be specified.")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     return args
 
@@ -92,8 +92,10 @@ class ClusteringDefinition():
         self.order = order.upper()
 
 class TableDefinition():
-    def __init__(self, name):
+    def __init__(self, name, source=None, is_view=False):
         self.name = name
+        self.source = source
+        self.is_view = is_view
         self.fields = []
         self.partition_key = []
         self.clustering = []
@@ -119,56 +121,63 @@ class TableDefinition():
     def has_options(self):
         return len(self.options) > 0
 
+    @property
+    def primary_key(self):
+        return self.partition_key + [clustering.field_name for clustering in self.clustering]
+
 class CqlGenerator(Generator):
-    def __init__(self, yaml_file, dir_name, file_name):
-        super().__init__(yaml_file)
+    def __init__(self, schema, dir_name, file_name):
+        super().__init__(schema)
 
         self.cql_types = []
         self.cql_tables = []
+        self._mapped = {}
 
-        for type_name, type_config in self.config.get('types', {}).items():
-            self._add_type(type_name, type_config)
+        for user_type in self.schema.types.values():
+            self._add_type(user_type)
 
-        for table_name, table_config in self.config.get('tables', {}).items():
-            self._add_table(table_name, table_config)
+        for table in self.schema.tables.values():
+            self._add_table(table)
 
         self.add_file(file_name, 'cql.j2', self, dir_name)
 
-    def _deep_config(self, type_config):
-        return { 'type': type_config } if str == type(type_config) else type_config
-
-    def _cql_type(self, input_config):
-        config = self._deep_config(input_config)
-        transformers = {
-            'list': lambda t: CqlType.list(self._cql_type(t['entries'])),
-            'map': lambda t: CqlType.map(self._cql_type(t['keys']), self._cql_type(t['values'])),
-            'set': lambda t: CqlType.set(self._cql_type(t['entries']))
-        }
-
-        if config['type'] in self.config.get('types', {}).keys():
-            return CqlType.user_defined(config['type'])
+    def _cql_type(self, schema_type):
+        """Maps every distinct type of the schema once."""
+        cql_type = self._mapped.get(schema_type.key)
+        if cql_type is None:
+            cql_type = self._mapped[schema_type.key] = self._map(schema_type)
+        return cql_type
+
+    def _map(self, schema_type):
+        if schema_type.is_user_defined:
+            return CqlType.user_defined(schema_type.name)
+        elif schema_type.name == 'list':
+            return CqlType.list(self._cql_type(schema_type.entries))
+        elif schema_type.name == 'set':
+            return CqlType.set(self._cql_type(schema_type.entries))
+        elif schema_type.name == 'map':
+            return CqlType.map(self._cql_type(schema_type.keys), self._cql_type(schema_type.values))
         else:
-            return transformers.get(config['type'], lambda t: CqlType.simple(t['type']))(config)
-
+            return CqlType.simple(schema_type.name)
 
-    def _add_type(self, name, config):
-        result = TypeDefinition(name)
-        for field_name, type_config in config.items():
-            result.add_field(field_name, self._cql_type(type_config))
+    def _add_type(self, user_type):
+        result = TypeDefinition(user_type.name)
+        for field in user_type.fields:
+            result.add_field(field.name, self._cql_type(field.schema_type))
 
         self.cql_types.append(result)
 
-    def _add_table(self, name, config):
-        result = TableDefinition(name)
-        for field_name, type_config in config['fields'].items():
-            result.add_field(field_name, self._cql_type(type_config))
+    def _add_table(self, table):
+        result = TableDefinition(table.name, table.source, table.is_view)
+        for field in table.fields:
+            result.add_field(field.name, self._cql_type(field.schema_type))
 
-        result.set_partition_key(config['partition_key'])
+        result.set_partition_key(table.partition_key)
 
-        for field_name, ordering in config.get('clustering', {}).items():
+        for field_name, ordering in table.clustering:
             result.add_clustering(field_name, ordering)
 
-        for option_name, option_config in config.get('options', {}).items():
+        for option_name, option_config in table.options:
             result.add_option(option_name, option_config)
 
         self.cql_tables.append(result)
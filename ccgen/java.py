@@ -6,9 +6,25 @@ from collections import OrderedDict
 
 from .generator import Generator, GeneratorRepresentable
 
+# Simple names of the nested classes of generated table classes, and of the
+# imported and java.lang classes they use, which projections can not have.
+RESERVED_CLASS_NAMES = frozenset([
+    'Page', 'Key', 'Cache', 'Updater', 'BatchWriter', 'CounterAccumulator', 'PreparedStatements',
+    'Spliterator', 'Spliterators', 'ConcurrentHashMap', 'ConcurrentMap', 'Stream', 'StreamSupport',
+    'BatchStatement', 'BoundStatement', 'ConsistencyLevel', 'KeyspaceMetadata', 'PagingState', 'PreparedStatement',
+    'RegularStatement', 'ResultSet', 'Row', 'Session', 'Statement', 'UserType', 'Insert', 'QueryBuilder', 'Select',
+    'Update', 'ImmutableList', 'MapMaker', 'FutureCallback', 'Futures', 'ListenableFuture',
+    'AutoCloseable', 'Boolean', 'Byte', 'Double', 'Float', 'IllegalStateException', 'Integer', 'InterruptedException',
+    'Long', 'Object', 'Override', 'Runnable', 'RuntimeException', 'Short', 'String', 'SuppressWarnings', 'Thread',
+    'Throwable'])
+
 class JavaType(GeneratorRepresentable):
     __metaclass__ = ABCMeta
 
+    is_user_defined = False
+    is_primitive = False
+    default_value = 'null'
+
     @staticmethod
     def classnamify(name):
         return ''.join([part.capitalize() for part in name.split('_')])
@@ -33,10 +49,22 @@ class JavaType(GeneratorRepresentable):
     def user_defined(name):
         return UserDefinedType(name)
 
+PRIMITIVE_DEFAULTS = {
+    'boolean': 'false', 'byte': '(byte) 0', 'short': '(short) 0', 'char': "'\\0'",
+    'int': '0', 'long': '0L', 'float': '0F', 'double': '0D' }
+
 class SimpleType(JavaType):
     def __init__(self, name):
         self.name = name
 
+    @property
+    def is_primitive(self):
+        return self.name in PRIMITIVE_DEFAULTS
+
+    @property
+    def default_value(self):
+        return PRIMITIVE_DEFAULTS.get(self.name, 'null')
+
     def repr(self):
         return self.name
 
@@ -57,16 +85,139 @@ class MapType(JavaType):
         return 'java.util.Map<{keys},{values}>'.format(keys=self.keys.repr(),values=self.values.repr())
 
 class UserDefinedType(JavaType):
+    is_user_defined = True
+
     def __init__(self, name):
         self.name = name
 
     def repr(self):
         return '{name}'.format(name=JavaType.classnamify(self.name))
 
+class JavaTypeMapping():
+    """
+    How values of a CQL type are represented in Java, read from rows and
+    UDT values (getter), bound to statements (setter) and converted to the
+    value the driver expects (converter).
+    """
+    def __init__(self, java_type, boxed_java_type, getter_format, setter_format, converter_format='{java_name}'):
+        self.java_type = java_type
+        self.boxed_java_type = boxed_java_type
+        self.getter_format = getter_format
+        self.setter_format = setter_format
+        self.converter_format = converter_format
+
+    @staticmethod
+    def simple(java_name, boxed_java_name, getter, setter):
+        return JavaTypeMapping(
+            JavaType.simple(java_name),
+            JavaType.simple(boxed_java_name),
+            '{variable}.%s({column})' % getter,
+            '.%s("{cql_name}", {variable})' % setter)
+
+# CQL type: Java type, boxed Java type, driver getter and setter.
+SIMPLE_TYPES = {
+    'ascii': ('String', 'String', 'getString', 'setString'),
+    'bigint': ('long', 'Long', 'getLong', 'setLong'),
+    'blob': ('java.nio.ByteBuffer', 'java.nio.ByteBuffer', 'getBytes', 'setBytes'),
+    'boolean': ('boolean', 'Boolean', 'getBool', 'setBool'),
+    'counter': ('long', 'Long', 'getLong', 'setLong'),
+    'decimal': ('java.math.BigDecimal', 'java.math.BigDecimal', 'getDecimal', 'setDecimal'),
+    'double': ('double', 'Double', 'getDouble', 'setDouble'),
+    'float': ('float', 'Float', 'getFloat', 'setFloat'),
+    'inet': ('java.net.InetAddress', 'java.net.InetAddress', 'getInet', 'setInet'),
+    'int': ('int', 'Integer', 'getInt', 'setInt'),
+    'text': ('String', 'String', 'getString', 'setString'),
+    'timeuuid': ('java.util.UUID', 'java.util.UUID', 'getUUID', 'setUUID'),
+    'uuid': ('java.util.UUID', 'java.util.UUID', 'getUUID', 'setUUID'),
+    'varchar': ('String', 'String', 'getString', 'setString'),
+    'varint': ('java.math.BigInteger', 'java.math.BigInteger', 'getVarint', 'setVarint'),
+}
+
+class JavaTypeRegistry():
+    """
+    Maps the types of a schema to JavaTypeMappings. It is built once per
+    schema, and maps every distinct type (by its key) only once, including
+    the entries, keys and values of collections.
+
+    Mappings of CQL types can be added or replaced with the java_types
+    option, e.g.:
+
+        java_types:
+          timestamp:
+            type: java.util.Date
+            getter: getDate
+            setter: setDate
+    """
+    def __init__(self, schema, codecs=False):
+        self.codecs = codecs
+        self.mappings = { name: JavaTypeMapping.simple(*config) for name, config in SIMPLE_TYPES.items() }
+        if codecs:
+            self.mappings['timestamp'] = JavaTypeMapping(
+                JavaType.simple('java.time.Instant'),
+                JavaType.simple('java.time.Instant'),
+                '{variable}.get({column}, java.time.Instant.class)',
+                '.set("{cql_name}", {variable}, java.time.Instant.class)')
+        else:
+            self.mappings['timestamp'] = JavaTypeMapping(
+                JavaType.simple('java.time.Instant'),
+                JavaType.simple('java.time.Instant'),
+                '{variable}.getDate({column}).toInstant()',
+                '.setDate("{cql_name}", {variable})',
+                'new java.util.Date({java_name}.toEpochMilli())')
+
+        for name, config in schema.options.get('java_types', {}).items():
+            missing = [key for key in ('type', 'getter', 'setter') if key not in config]
+            if missing:
+                raise ValueError("Java type mapping of '%s' is missing: %s." % (name, ', '.join(missing)))
+            self.mappings[name] = JavaTypeMapping.simple(config['type'], config.get('boxed', config['type']), config['getter'], config['setter'])
+
+        self._mapped = {}
+
+    def lookup(self, schema_type):
+        mapping = self._mapped.get(schema_type.key)
+        if mapping is None:
+            mapping = self._mapped[schema_type.key] = self._map(schema_type)
+        return mapping
+
+    def _map(self, schema_type):
+        if schema_type.is_user_defined:
+            java_type = JavaType.user_defined(schema_type.name)
+            if self.codecs:
+                return JavaTypeMapping(
+                    java_type, java_type,
+                    '{variable}.get({column}, %s.class)' % java_type.repr(),
+                    '.set("{cql_name}", {variable}, %s.class)' % java_type.repr())
+            return JavaTypeMapping(
+                java_type, java_type,
+                'new %s({variable}.getUDTValue({column}))' % java_type.repr(),
+                '.setUDTValue("{cql_name}", {variable})',
+                '{java_name}.toUDTValue({keyspace_variable})')
+        elif schema_type.name in ('list', 'set'):
+            entries = self.lookup(schema_type.entries).boxed_java_type
+            java_type = JavaType.list(entries) if schema_type.name == 'list' else JavaType.set(entries)
+            method = schema_type.name.capitalize()
+            return JavaTypeMapping(
+                java_type, java_type,
+                '{variable}.get%s({column}, %s.class)' % (method, entries.repr()),
+                '.set%s("{cql_name}", {variable})' % method)
+        elif schema_type.name == 'map':
+            keys = self.lookup(schema_type.keys).boxed_java_type
+            values = self.lookup(schema_type.values).boxed_java_type
+            java_type = JavaType.map(keys, values)
+            return JavaTypeMapping(
+                java_type, java_type,
+                '{variable}.getMap({column}, %s.class, %s.class)' % (keys.repr(), values.repr()),
+                '.setMap("{cql_name}", {variable})')
+        elif schema_type.name in self.mappings:
+            return self.mappings[schema_type.name]
+        else:
+            raise ValueError("No Java type for CQL type '%s', add a mapping for it to the java_types option." % schema_type.name)
+
 class JavaFieldDefinition():
-    def __init__(self, name, java_type, getter_format, setter_format, converter_format, is_key = False):
+    def __init__(self, name, java_type, getter_format, setter_format, converter_format, is_key = False, boxed_java_type = None):
         self.name = name
         self.java_type = java_type
+        self.boxed_java_type = boxed_java_type or java_type
         self.getter_format = getter_format
         self.setter_format = setter_format
         self.converter_format = converter_format
@@ -87,20 +238,56 @@ class JavaFieldDefinition():
     def is_not_key(self):
         return not self.is_key
 
+    @property
+    def is_user_defined(self):
+        return self.java_type.is_user_defined
+
+    @property
+    def is_nullable(self):
+        return not self.java_type.is_primitive
+
+    @property
+    def is_optional(self):
+        """Nullable non-key fields, which are not written when null."""
+        return self.is_nullable and self.is_not_key
+
+    @property
+    def needs_user_type(self):
+        """Whether converting the value for the driver needs its UserType, see convert."""
+        return '{keyspace_variable}' in self.converter_format
+
     def convert(self, keyspace_variable):
         return self.converter_format.format(java_name=self.java_name, cql_name=self.cql_name, keyspace_variable=keyspace_variable)
 
+    def convert_or_null(self, keyspace_variable):
+        converted = self.convert(keyspace_variable)
+        if self.is_nullable and converted != self.java_name:
+            return '{java_name} == null ? null : {converted}'.format(java_name=self.java_name, converted=converted)
+        return converted
+
     def getter(self, variable):
-        return self.getter_format.format(java_name=self.java_name, cql_name=self.cql_name, variable=variable)
+        return self.getter_format.format(java_name=self.java_name, cql_name=self.cql_name, variable=variable, column='"%s"' % self.cql_name)
+
+    def indexed_getter(self, variable, index):
+        return self.getter_format.format(java_name=self.java_name, cql_name=self.cql_name, variable=variable, column=index)
 
     def setter(self, variable):
         return self.setter_format.format(java_name=self.java_name, cql_name=self.cql_name, variable=variable)
 
 class JavaTypeDefinition():
-    def __init__(self, name, package):
+    def __init__(self, name, package, index_mapping=False, is_counter=False, execution=None, cache=None, source=None, is_view=False):
         self.name = name
         self.package = package
+        self.index_mapping = index_mapping
+        self.is_counter = is_counter
+        self.execution = execution
+        self.cache = cache
+        self.source = source
+        self.is_view = is_view
         self.fields = []
+        self.partition_key = []
+        self.projections = []
+        self.query_tables = []
 
     @property
     def java_name(self):
@@ -110,147 +297,136 @@ class JavaTypeDefinition():
     def cql_name(self):
         return self.name
 
-    def add_field(self, name, java_type, getter, setter, converter, is_key=False):
-        self.fields.append(JavaFieldDefinition(name, java_type, getter, setter, converter, is_key))
+    @property
+    def partition_key_fields(self):
+        fields = { field.name: field for field in self.fields }
+        return [fields[name] for name in self.partition_key]
+
+    def add_field(self, name, java_type, getter, setter, converter, is_key=False, boxed_java_type=None):
+        self.fields.append(JavaFieldDefinition(name, java_type, getter, setter, converter, is_key, boxed_java_type))
+
+    def set_partition_key(self, names):
+        self.partition_key = names
+
+    def add_projection(self, name, field_names):
+        fields = { field.name: field for field in self.fields }
+        self.projections.append(JavaProjectionDefinition(name, [fields[field_name] for field_name in field_names]))
+
+class JavaProjectionDefinition():
+    """A named subset of the columns of a table, mapped to its own class."""
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    @property
+    def java_name(self):
+        return JavaType.classnamify(self.name)
+
+class JavaCodecsDefinition():
+    def __init__(self, name, package, types):
+        self.name = name
+        self.package = package
+        self.types = types
+
+    @property
+    def java_name(self):
+        return '%sCodecs' % JavaType.classnamify(self.name)
 
 class JavaGenerator(Generator):
-    def __init__(self, yaml_file, dir_name):
-        super().__init__(yaml_file)
+    def __init__(self, schema, dir_name):
+        super().__init__(schema)
+        self.registry = JavaTypeRegistry(schema, self._codecs)
 
-        for type_name, type_config in self.config.get('types', {}).items():
+        types = [self._get_type(user_type) for user_type in self.schema.types.values()]
+        for type_definition in types:
             self.add_file(
-                '%s.java' % JavaType.classnamify(type_name),
+                '%s.java' % type_definition.java_name,
                 'java_type.j2',
-                self._get_type(type_name, type_config),
-                os.path.join(dir_name, self.config['options']['package'].replace('.', os.path.sep)))
-
-        for table_name, table_config in self.config.get('tables', {}).items():
+                type_definition,
+                os.path.join(dir_name, self.schema.options['package'].replace('.', os.path.sep)),
+                [('type', type_definition.name)])
+
+        tables = OrderedDict((table.name, self._get_table(table)) for table in self.schema.tables.values())
+        for table in self.schema.tables.values():
+            # Query tables are written along with their source table, views are written by Cassandra.
+            tables[table.name].query_tables = [tables[name] for name in table.query_tables if not tables[name].is_view]
             self.add_file(
-                '%s.java' % JavaType.classnamify(table_name),
+                '%s.java' % tables[table.name].java_name,
                 'java_class.j2',
-                self._get_table(table_name, table_config),
-                os.path.join(dir_name, self.config['options']['package'].replace('.', os.path.sep)))
-
-    def _deep_config(self, type_config):
-        return { 'type': type_config } if str == type(type_config) else type_config
-
-    def _java_type(self, input_config, boxed=False):
-        config = self._deep_config(input_config)
-        transformers = {
-            'ascii': lambda t: JavaType.simple('String'),
-            'bigint': lambda t: JavaType.simple('Long' if boxed else 'long'),
-            'blob': lambda t: JavaType.simple('java.nio.ByteBuffer'),
-            'boolean': lambda t: JavaType.simple('Boolean' if boxed else 'boolean'),
-            'counter': lambda t: JavaType.simple('Long' if boxed else 'long'),
-            'decimal': lambda t: JavaType.simple('java.math.BigDecimal'),
-            'double': lambda t: JavaType.simple('Double' if boxed else 'double'),
-            'float': lambda t: JavaType.simple('Float' if boxed else 'float'),
-            'inet': lambda t: JavaType.simple('java.net.InetAddress'),
-            'int': lambda t: JavaType.simple('Integer' if boxed else 'int'),
-            'text': lambda t: JavaType.simple('String'),
-            'timestamp': lambda t: JavaType.simple('java.time.Instant'),
-            'timeuuid': lambda t: JavaType.simple('java.util.UUID'),
-            'uuid': lambda t: JavaType.simple('java.util.UUID'),
-            'varchar': lambda t: JavaType.simple('String'),
-            'varint': lambda t: JavaType.simple('java.math.BigInteger'),
-            'list': lambda t: JavaType.list(self._java_type(t['entries'], True)),
-            'map': lambda t: JavaType.map(self._java_type(t['keys'], True), self._java_type(t['values'], True)),
-            'set': lambda t: JavaType.set(self._java_type(t['entries'], True))
-        }
-
-        if config['type'] in self.config.get('types', {}).keys():
-            return JavaType.user_defined(config['type'])
-        else:
-            return transformers[config['type']](config)
-
-    def _getter_format(self, input_config):
-        config = self._deep_config(input_config)
-        transformers = {
-            'ascii': lambda t: '{variable}.getString("{cql_name}")',
-            'bigint': lambda t: '{variable}.getLong("{cql_name}")',
-            'blob': lambda t: '{variable}.getBytes("{cql_name}")',
-            'boolean': lambda t: '{variable}.getBool("{cql_name}")',
-            'counter': lambda t: '{variable}.getLong("{cql_name}")',
-            'decimal': lambda t: '{variable}.getDecimal("{cql_name}")',
-            'double': lambda t: '{variable}.getDouble("{cql_name}")',
-            'float': lambda t: '{variable}.getDouble("{cql_name}")',
-            'inet': lambda t: '{variable}.getInet("{cql_name}")',
-            'int': lambda t: '{variable}.getInt("{cql_name}")',
-            'text': lambda t: '{variable}.getString("{cql_name}")',
-            'timestamp': lambda t: '{variable}.getDate("{cql_name}").toInstant()',
-            'timeuuid': lambda t: '{variable}.getUUID("{cql_name}")',
-            'uuid': lambda t:  '{variable}.getUUID("{cql_name}")',
-            'varchar': lambda t: '{variable}.getString("{cql_name}")',
-            'varint': lambda t: '{variable}.getVarint("{cql_name}")',
-            'list': lambda t: '{variable}.getList("{cql_name}", %s.class)' % self._java_type(t['entries'], True).repr(),
-            'map': lambda t: '{variable}.getMap("{cql_name}", %s.class, %s.class)' % (self._java_type(t['keys'], True).repr(), self._java_type(t['values'], True).repr()),
-            'set': lambda t: '{variable}.getSet("{cql_name}", %s.class)' % self._java_type(t['entries'], True).repr()
-        }
-
-        if config['type'] in self.config.get('types', {}).keys():
-            return 'new %s({variable}.getUDTValue("{cql_name}"))' % self._java_type(config).repr()
-        else:
-            return transformers[config['type']](config)
-
-    def _setter_format(self, input_config):
-        config = self._deep_config(input_config)
-        transformers = {
-            'ascii': lambda t: '.setString("{cql_name}", {variable})',
-            'bigint': lambda t: '.setLong("{cql_name}", {variable})',
-            'blob': lambda t: '.setBytes("{cql_name}", {variable})',
-            'boolean': lambda t: '.setBool("{cql_name}", {variable})',
-            'counter': lambda t: '.setLong("{cql_name}", {variable})',
-            'decimal': lambda t: '.setDecimal("{cql_name}", {variable})',
-            'double': lambda t: '.setDouble("{cql_name}", {variable})',
-            'float': lambda t: '.setDouble("{cql_name}", {variable})',
-            'inet': lambda t: '.setInet("{cql_name}", {variable})',
-            'int': lambda t: '.setInt("{cql_name}", {variable})',
-            'text': lambda t: '.setString("{cql_name}", {variable})',
-            'timestamp': lambda t: '.setDate("{cql_name}", {variable})',
-            'timeuuid': lambda t: '.setUUID("{cql_name}", {variable})',
-            'uuid': lambda t:  '.setUUID("{cql_name}", {variable})',
-            'varchar': lambda t: '.setString("{cql_name}", {variable})',
-            'varint': lambda t: '.setVarint("{cql_name}", {variable})',
-            'list': lambda t: '.setList("{cql_name}", {variable})',
-            'map': lambda t: '.setMap("{cql_name}", {variable})',
-            'set': lambda t: '.setSet("{cql_name}", {variable})'
-        }
-
-        if config['type'] in self.config.get('types', {}).keys():
-            return '.setUDTValue("{cql_name}", {variable})'
-        else:
-            return transformers[config['type']](config)
-
-    def _converter_format(self, input_config):
-        config = self._deep_config(input_config)
-        if config['type'] in self.config.get('types', {}).keys():
-            return '{java_name}.toUDTValue({keyspace_variable})'
-        elif config['type'] == 'timestamp':
-            return 'new java.util.Date({java_name}.toEpochMilli())'
-        else:
-            return '{java_name}'
+                tables[table.name],
+                os.path.join(dir_name, self.schema.options['package'].replace('.', os.path.sep)),
+                [('table', table.name)] + [('table', name) for name in table.query_tables])
+
+        if self._codecs:
+            for type_definition in types:
+                self.add_file(
+                    '%sCodec.java' % type_definition.java_name,
+                    'java_codec.j2',
+                    type_definition,
+                    os.path.join(dir_name, self.schema.options['package'].replace('.', os.path.sep)),
+                    [('type', type_definition.name)])
+
+            codecs = JavaCodecsDefinition(self.schema.options['keyspace'], self.schema.options['package'], types)
+            self.add_file(
+                '%s.java' % codecs.java_name,
+                'java_codecs.j2',
+                codecs,
+                os.path.join(dir_name, self.schema.options['package'].replace('.', os.path.sep)))
 
-    def _get_type(self, name, config):
-        result = JavaTypeDefinition(name, self.config['options']['package'])
-        for field_name, type_config in config.items():
+    @property
+    def _index_mapping(self):
+        row_mapping = self.schema.options.get('row_mapping', 'name')
+        if row_mapping not in ('name', 'index'):
+            raise ValueError("Unsupported row_mapping '%s', expected 'name' or 'index'." % row_mapping)
+        return row_mapping == 'index'
+
+    @property
+    def _codecs(self):
+        """
+        With codecs enabled, user defined types and timestamps are mapped by
+        generated TypeCodecs (driver 3.x), instead of through UDTValue and
+        java.util.Date.
+        """
+        return bool(self.schema.options.get('codecs', False))
+
+    def _get_type(self, user_type):
+        result = JavaTypeDefinition(user_type.name, self.schema.options['package'], self._index_mapping)
+        for field in user_type.fields:
+            mapping = self.registry.lookup(field.schema_type)
             result.add_field(
-                field_name,
-                self._java_type(type_config),
-                self._getter_format(type_config),
-                self._setter_format(type_config),
-                self._converter_format(type_config))
+                field.name,
+                mapping.java_type,
+                mapping.getter_format,
+                mapping.setter_format,
+                mapping.converter_format,
+                boxed_java_type=mapping.boxed_java_type)
 
         return result
 
-    def _get_table(self, name, config):
-        result = JavaTypeDefinition(name, self.config['options']['package'])
-        for field_name, type_config in config['fields'].items():
+    def _get_table(self, table):
+        result = JavaTypeDefinition(table.name, self.schema.options['package'], self._index_mapping, table.is_counter, table.execution, table.cache,
+            table.source, table.is_view)
+        for field in table.fields:
+            mapping = self.registry.lookup(field.schema_type)
             result.add_field(
-                field_name,
-                self._java_type(type_config),
-                self._getter_format(type_config),
-                self._setter_format(type_config),
-                self._converter_format(type_config),
-                field_name in config['partition_key'] or field_name in config.get('clustering', {}).keys())
+                field.name,
+                mapping.java_type,
+                mapping.getter_format,
+                mapping.setter_format,
+                mapping.converter_format,
+                table.is_key(field.name),
+                mapping.boxed_java_type)
+
+        result.set_partition_key(table.partition_key)
+        # Projections are nested classes, which hide the classes of the same package with the same name.
+        taken = set(RESERVED_CLASS_NAMES) | set(JavaType.classnamify(name) for name in list(self.schema.types) + list(self.schema.tables))
+        taken.add(result.java_name + 'Fields')
+        for name, field_names in table.projections.items():
+            if JavaType.classnamify(name) in taken:
+                raise ValueError(
+                    "Projection '%s' of table '%s' clashes with the Java class %s, used by the generated class."
+                    % (name, table.name, JavaType.classnamify(name)))
+            result.add_projection(name, field_names)
+            taken.add(JavaType.classnamify(name))
 
         return result
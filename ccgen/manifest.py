@@ -0,0 +1,105 @@
+import os
+import json
+import hashlib
+
+from .output import write_atomic
+
+def _digest(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+def _file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return _digest(f.read())
+    except (IOError, OSError):
+        return None
+
+def template_digest(template_dir):
+    """Digest over the names and contents of all templates in template_dir."""
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(template_dir)):
+        h.update(name.encode('utf-8'))
+        with open(os.path.join(template_dir, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+class Manifest():
+    """
+    Records what was generated from each input file, so that a subsequent run
+    can skip inputs that are up to date, leave unchanged outputs untouched and
+    remove outputs for tables or types that no longer exist.
+
+    The fingerprint covers everything besides the input file itself that
+    influences the generated output (ccgen version, templates, output options).
+
+    Inputs and outputs are recorded by their normalized path relative to the
+    directory of the manifest, so that runs from any working directory agree.
+    """
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.base = os.path.dirname(os.path.abspath(path))
+        self.fingerprint = fingerprint
+        self.inputs = {}
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                inputs = json.load(f).get('inputs', {})
+            for input_file, entry in inputs.items():
+                entry['outputs'] = { os.path.normpath(output): digest for output, digest in entry['outputs'].items() }
+                self.inputs[os.path.normpath(input_file)] = entry
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.base)
+
+    def _path(self, key):
+        return os.path.relpath(os.path.join(self.base, key))
+
+    def input_key(self, input_file):
+        with open(input_file, 'rb') as f:
+            return _digest(self.fingerprint + _digest(f.read()))
+
+    def outputs(self, input_file):
+        """The paths of the outputs that were recorded for input_file."""
+        return [self._path(key) for key in self.inputs.get(self._key(input_file), {}).get('outputs', {})]
+
+    def is_up_to_date(self, input_file):
+        entry = self.inputs.get(self._key(input_file))
+        if entry is None or entry['key'] != self.input_key(input_file):
+            return False
+
+        return all(_file_digest(self._path(key)) == digest for key, digest in entry['outputs'].items())
+
+    def needs_write(self, path, contents):
+        return _file_digest(path) != _digest(contents)
+
+    def update(self, input_file, outputs):
+        """
+        Record the outputs (a dict of path to contents) generated from input_file.
+        Returns the paths that were previously generated from input_file, but are
+        no longer part of its outputs.
+        """
+        previous = self.inputs.get(self._key(input_file), {}).get('outputs', {})
+        self.inputs[self._key(input_file)] = {
+            'key': self.input_key(input_file),
+            'outputs': { self._key(path): _digest(contents) for path, contents in outputs.items() }
+        }
+
+        return self._unclaimed(previous)
+
+    def retain(self, input_files):
+        """
+        Forget the inputs that are not in input_files. Returns the paths that
+        were generated from them, and are not generated from any other input.
+        """
+        keep = set(self._key(input_file) for input_file in input_files)
+        previous = [path for input_file in list(self.inputs) if input_file not in keep for path in self.inputs.pop(input_file)['outputs']]
+        return self._unclaimed(previous)
+
+    def _unclaimed(self, keys):
+        claimed = set(key for entry in self.inputs.values() for key in entry['outputs'])
+        return sorted(set(self._path(key) for key in keys if key not in claimed))
+
+    def save(self):
+        write_atomic(self.path, json.dumps({ 'inputs': self.inputs }, indent=2, sort_keys=True))
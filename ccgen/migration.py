@@ -0,0 +1,110 @@
+from .cql import CqlGenerator
+from .generator import Generator
+
+class TypeAlteration():
+    def __init__(self, name, added_fields):
+        self.name = name
+        self.added_fields = added_fields
+
+class TableAlteration():
+    def __init__(self, name, added_fields, dropped_fields, options, removed_options, is_view=False):
+        self.name = name
+        self.is_view = is_view
+        self.added_fields = added_fields
+        self.dropped_fields = dropped_fields
+        self.options = options
+        self.removed_options = removed_options
+
+    @property
+    def is_empty(self):
+        return not (self.added_fields or self.dropped_fields or self.options or self.removed_options)
+
+class MigrationGenerator(Generator):
+    """
+    Generates the CQL that migrates a keyspace from a previous version of a
+    schema to the current one: new types and tables, added and dropped
+    columns, added fields of types, changed table options and dropped
+    tables and types. Changes that can not be applied to an existing
+    keyspace, like changes to a primary key or to the type of a column,
+    raise a ValueError that lists all of them.
+    """
+    def __init__(self, schema, previous, dir_name, file_name):
+        super().__init__(schema)
+
+        current = CqlGenerator(schema, dir_name, file_name)
+        before = CqlGenerator(previous, dir_name, file_name)
+
+        self.incompatibilities = []
+        if previous.options['keyspace'] != schema.options['keyspace']:
+            self.incompatibilities.append("The keyspace changed from '%s' to '%s'." % (previous.options['keyspace'], schema.options['keyspace']))
+
+        previous_types = { type_def.name: type_def for type_def in before.cql_types }
+        current_types = { type_def.name: type_def for type_def in current.cql_types }
+        self.created_types = [type_def for type_def in current.cql_types if type_def.name not in previous_types]
+        self.altered_types = [
+            alteration for alteration in (self._alter_type(previous_types[type_def.name], type_def) for type_def in current.cql_types if type_def.name in previous_types)
+            if alteration.added_fields]
+        # Types may be used by types defined before them, so they are dropped in reverse order.
+        self.dropped_types = [type_def.name for type_def in reversed(before.cql_types) if type_def.name not in current_types]
+
+        previous_tables = { table_def.name: table_def for table_def in before.cql_tables }
+        current_tables = { table_def.name: table_def for table_def in current.cql_tables }
+        self.created_tables = [table_def for table_def in current.cql_tables if table_def.name not in previous_tables and not table_def.is_view]
+        # Views are created last, as the columns they select may be added to their source tables first.
+        self.created_views = [table_def for table_def in current.cql_tables if table_def.name not in previous_tables and table_def.is_view]
+        self.altered_tables = [
+            alteration for alteration in (self._alter_table(previous_tables[table_def.name], table_def) for table_def in current.cql_tables if table_def.name in previous_tables)
+            if not alteration.is_empty]
+        self.dropped_tables = [table_def.name for table_def in before.cql_tables if table_def.name not in current_tables and not table_def.is_view]
+        # Views are dropped first, as the columns and tables they select from can not be dropped before them.
+        self.dropped_views = [table_def.name for table_def in before.cql_tables if table_def.name not in current_tables and table_def.is_view]
+
+        if self.incompatibilities:
+            raise ValueError('Incompatible schema changes:\n  %s' % '\n  '.join(self.incompatibilities))
+
+        self.add_file(file_name, 'migration.j2', self, dir_name)
+
+    @property
+    def is_empty(self):
+        return not (self.created_types or self.altered_types or self.dropped_types or self.created_tables or self.created_views or self.altered_tables or self.dropped_tables or self.dropped_views)
+
+    def _alter_type(self, before, after):
+        previous_fields = { field.name: field.cql_type.repr() for field in before.fields }
+        current_fields = set(field.name for field in after.fields)
+        for field in after.fields:
+            if field.name in previous_fields and previous_fields[field.name] != field.cql_type.repr():
+                self.incompatibilities.append("The type of field '%s' of type '%s' changed from %s to %s." % (field.name, after.name, previous_fields[field.name], field.cql_type.repr()))
+        for field in before.fields:
+            if field.name not in current_fields:
+                self.incompatibilities.append("Field '%s' was removed from type '%s', fields of types can not be dropped." % (field.name, after.name))
+
+        return TypeAlteration(after.name, [field for field in after.fields if field.name not in previous_fields])
+
+    def _alter_table(self, before, after):
+        previous_key = (before.partition_key, [(c.field_name, c.order) for c in before.clustering])
+        current_key = (after.partition_key, [(c.field_name, c.order) for c in after.clustering])
+        if previous_key != current_key:
+            self.incompatibilities.append("The primary key or clustering order of table '%s' changed." % after.name)
+
+        previous_fields = { field.name: field.cql_type.repr() for field in before.fields }
+        current_fields = set(field.name for field in after.fields)
+        for field in after.fields:
+            if field.name in previous_fields and previous_fields[field.name] != field.cql_type.repr():
+                self.incompatibilities.append("The type of column '%s' of table '%s' changed from %s to %s." % (field.name, after.name, previous_fields[field.name], field.cql_type.repr()))
+
+        previous_options = { option.name: option.repr() for option in before.options }
+        current_options = set(option.name for option in after.options)
+
+        alteration = TableAlteration(
+            after.name,
+            [field for field in after.fields if field.name not in previous_fields],
+            [field.name for field in before.fields if field.name not in current_fields],
+            [option for option in after.options if previous_options.get(option.name) != option.repr()],
+            [option.name for option in before.options if option.name not in current_options],
+            after.is_view)
+
+        if before.is_view != after.is_view:
+            self.incompatibilities.append("'%s' changed between a table and a materialized view." % after.name)
+        elif after.is_view and (alteration.added_fields or alteration.dropped_fields or before.source != after.source):
+            self.incompatibilities.append("The columns of materialized view '%s' changed, views can only be dropped and created again." % after.name)
+        return alteration
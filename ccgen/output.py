@@ -0,0 +1,61 @@
+import io
+import os
+
+# Directories that are known to exist, so that writing many files into the
+# same directory does not check for (and create) it for every file.
+_directories = set()
+
+# Timestamp of all srcjar entries, so that equal sources make equal archives.
+_SRCJAR_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def _make_directory(directory):
+    if directory and directory not in _directories:
+        os.makedirs(directory, exist_ok=True)
+        _directories.add(directory)
+
+def write_atomic(path, data):
+    """
+    Writes data (str or bytes) to a temporary file next to path, which is
+    then renamed to path. Readers, and runs that are killed halfway, see
+    either the previous or the new contents of path, never a partial file.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    directory = os.path.dirname(path)
+    temporary = os.path.join(directory, '.%s.%d.tmp' % (os.path.basename(path), os.getpid()))
+
+    _make_directory(directory)
+    try:
+        f = open(temporary, 'wb')
+    except FileNotFoundError:
+        # The directory was removed after it was created.
+        _directories.discard(directory)
+        _make_directory(directory)
+        f = open(temporary, 'wb')
+
+    try:
+        with f:
+            f.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+def write_srcjar(path, entries):
+    """
+    Writes a source archive (a zip file) with entries, a list of (name,
+    contents) tuples, to path. The archive is built in memory and written
+    at once.
+    """
+    import zipfile
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as srcjar:
+        for name, contents in entries:
+            info = zipfile.ZipInfo(name.replace(os.path.sep, '/'), date_time=_SRCJAR_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            srcjar.writestr(info, contents.encode('utf-8'))
+    write_atomic(path, buffer.getvalue())
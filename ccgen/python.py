@@ -0,0 +1,109 @@
+import keyword
+
+from .generator import Generator
+
+# Names of the class attributes and method arguments of generated table
+# classes, which columns can not have.
+RESERVED_NAMES = frozenset([
+    'table', 'partition_key', 'primary_key', 'select_cql', 'execution_profile', 'get', 'partition',
+    'insert', 'increment', 'delete', 'session', 'fetch_size', 'self', 'cls'])
+
+class PythonFieldDefinition():
+    def __init__(self, name, schema_type, is_key=False):
+        self.name = name
+        self.schema_type = schema_type
+        self.is_key = is_key
+
+    @property
+    def cql_type(self):
+        return self.schema_type.key
+
+    @property
+    def is_not_key(self):
+        return not self.is_key
+
+class PythonTypeDefinition():
+    def __init__(self, name):
+        self.name = name
+        self.fields = []
+
+    @property
+    def class_name(self):
+        return ''.join([part.capitalize() for part in self.name.split('_')])
+
+    def add_field(self, name, schema_type, is_key=False):
+        if keyword.iskeyword(name) or name == 'self':
+            raise ValueError("Field '%s' of '%s' can not be used as a Python attribute." % (name, self.name))
+        self.fields.append(PythonFieldDefinition(name, schema_type, is_key))
+
+class PythonTableDefinition(PythonTypeDefinition):
+    def __init__(self, name, partition_key, clustering_key, is_counter, execution, is_view=False):
+        super().__init__(name)
+        self.partition_key = partition_key
+        self.clustering_key = clustering_key
+        self.is_counter = is_counter
+        self.execution = execution
+        self.is_view = is_view
+
+    def add_field(self, name, schema_type, is_key=False):
+        if name in RESERVED_NAMES:
+            raise ValueError("Column '%s' of table '%s' clashes with a member of the generated Python class." % (name, self.name))
+        super().add_field(name, schema_type, is_key)
+
+    @property
+    def primary_key(self):
+        return self.partition_key + self.clustering_key
+
+    @property
+    def statements(self):
+        """The statements of the table, materialized views are only read."""
+        if self.is_view:
+            return ['get', 'partition']
+        return ['get', 'partition', 'increment' if self.is_counter else 'insert', 'delete']
+
+    def settings(self, statement):
+        """
+        The attributes of the prepared statement that carry the execution
+        settings of the table, as (name, Python expression) tuples. Bound
+        statements copy them from the prepared statement.
+        """
+        execution = self.execution
+        if statement in ('get', 'partition'):
+            settings = [('consistency_level', execution.read_consistency), ('fetch_size', execution.fetch_size)]
+            idempotent = execution.is_idempotent('read')
+        else:
+            settings = [('consistency_level', execution.write_consistency), ('serial_consistency_level', execution.serial_consistency)]
+            idempotent = execution.is_idempotent(statement)
+        result = [
+            (name, 'ConsistencyLevel.%s' % value.upper() if name.endswith('consistency_level') else repr(value))
+            for name, value in settings if value is not None]
+        return result + [('is_idempotent', repr(idempotent))]
+
+class PythonGenerator(Generator):
+    """
+    Generates a single Python module for the cassandra-driver package, with
+    a class with __slots__ per user defined type and table.
+    """
+    def __init__(self, schema, dir_name):
+        super().__init__(schema)
+
+        self.types = []
+        self.tables = []
+
+        for user_type in self.schema.types.values():
+            result = PythonTypeDefinition(user_type.name)
+            for field in user_type.fields:
+                result.add_field(field.name, field.schema_type)
+            self.types.append(result)
+
+        for table in self.schema.tables.values():
+            result = PythonTableDefinition(table.name, table.partition_key, table.clustering_key, table.is_counter, table.execution, table.is_view)
+            for field in table.fields:
+                result.add_field(field.name, field.schema_type, table.is_key(field.name))
+            self.tables.append(result)
+
+        self.add_file('%s.py' % self.module_name, 'python_module.j2', self, dir_name)
+
+    @property
+    def module_name(self):
+        return self.schema.options.get('python_module', self.schema.options['keyspace'])
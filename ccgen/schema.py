@@ -0,0 +1,370 @@
+import yaml
+from collections import OrderedDict
+
+# libyaml's parser is an order of magnitude faster than the pure Python one.
+# Construction of the nodes into Python objects happens in Python for both,
+# so the ordered mapping constructors below work with either of them.
+_Loader = getattr(yaml, 'CLoader', yaml.Loader)
+
+# Inspired by: https://gist.github.com/enaeseth/844388
+# We need this as ordering is important for example when
+# defining user defined types that depend on each other.
+class OrderedDictYAMLLoader(_Loader):
+    def __init__(self, *args, **kwargs):
+        _Loader.__init__(self, *args, **kwargs)
+
+        self.add_constructor(u'tag:yaml.org,2002:map', type(self).construct_yaml_map)
+        self.add_constructor(u'tag:yaml.org,2002:omap', type(self).construct_yaml_map)
+
+    def construct_yaml_map(self, node):
+        data = OrderedDict()
+        yield data
+        value = self.construct_mapping(node)
+        data.update(value)
+
+    def construct_mapping(self, node, deep=False):
+        if isinstance(node, yaml.MappingNode):
+            self.flatten_mapping(node)
+        else:
+            raise yaml.constructor.ConstructorError(None, None,
+                'expected a mapping node, but found %s' % node.id, node.start_mark)
+
+        mapping = OrderedDict()
+        for key_node, value_node in node.value:
+            key = self.construct_object(key_node, deep=deep)
+            try:
+                hash(key)
+            except TypeError as exc:
+                raise yaml.constructor.ConstructorError('while constructing a mapping',
+                    node.start_mark, 'found unacceptable key (%s)' % exc, key_node.start_mark)
+            value = self.construct_object(value_node, deep=deep)
+            mapping[key] = value
+        return mapping
+
+# The native CQL types. Not all of them are mapped by every generator.
+CQL_TYPES = frozenset([
+    'ascii', 'bigint', 'blob', 'boolean', 'counter', 'date', 'decimal', 'double', 'duration', 'float', 'inet',
+    'int', 'smallint', 'text', 'time', 'timestamp', 'timeuuid', 'tinyint', 'uuid', 'varchar', 'varint'])
+
+CONSISTENCY_LEVELS = frozenset([
+    'any', 'one', 'two', 'three', 'quorum', 'all', 'local_quorum', 'each_quorum', 'serial', 'local_serial', 'local_one'])
+
+SERIAL_CONSISTENCY_LEVELS = frozenset(['serial', 'local_serial'])
+
+# Writes that change the stored value again when they are applied twice, as
+# happens when the driver retries them or executes them speculatively.
+NON_IDEMPOTENT_OPERATIONS = frozenset(['increment'])
+
+class SchemaType():
+    """
+    A resolved type expression. Either a simple CQL type, a collection
+    with resolved entries (list, set) or keys and values (map), or a
+    reference to one of the user defined types of the schema.
+
+    Equal type expressions of a schema resolve to the same instance, so
+    generators can map each distinct type once, by its key.
+    """
+    def __init__(self, name, entries=None, keys=None, values=None, is_user_defined=False):
+        self.name = name
+        self.entries = entries
+        self.keys = keys
+        self.values = values
+        self.is_user_defined = is_user_defined
+        self.key = SchemaType.key_of(name, entries, keys, values)
+
+    @staticmethod
+    def key_of(name, entries=None, keys=None, values=None):
+        if entries is not None:
+            return '%s<%s>' % (name, entries.key)
+        elif keys is not None:
+            return '%s<%s,%s>' % (name, keys.key, values.key)
+        else:
+            return name
+
+    @property
+    def is_collection(self):
+        return self.name in ('list', 'set', 'map')
+
+    @property
+    def user_types(self):
+        """The names of the user defined types referenced by this type."""
+        if self.is_user_defined:
+            return [self.name]
+        return [name for nested in (self.entries, self.keys, self.values) if nested is not None for name in nested.user_types]
+
+class SchemaField():
+    def __init__(self, name, schema_type):
+        self.name = name
+        self.schema_type = schema_type
+
+class SchemaUserType():
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.fields = []
+
+class SchemaExecution():
+    """
+    The driver settings of the statements of a table, from its execution
+    section. Settings that are not given are left to the driver.
+    """
+    def __init__(self, table_name, config):
+        unknown = [key for key in config if key not in ('fetch_size', 'read_consistency', 'write_consistency', 'serial_consistency', 'idempotent')]
+        if unknown:
+            raise ValueError("Unknown execution settings of table '%s': %s." % (table_name, ', '.join(unknown)))
+
+        self.fetch_size = config.get('fetch_size')
+        if self.fetch_size is not None and (type(self.fetch_size) != int or self.fetch_size <= 0):
+            raise ValueError("The fetch_size of table '%s' must be a positive number." % table_name)
+
+        self.read_consistency = self._consistency(table_name, config, 'read_consistency', CONSISTENCY_LEVELS)
+        self.write_consistency = self._consistency(table_name, config, 'write_consistency', CONSISTENCY_LEVELS)
+        self.serial_consistency = self._consistency(table_name, config, 'serial_consistency', SERIAL_CONSISTENCY_LEVELS)
+
+        self.idempotent = config.get('idempotent')
+        if self.idempotent not in (None, True, False):
+            raise ValueError("The idempotent setting of table '%s' must be true or false." % table_name)
+
+    @staticmethod
+    def _consistency(table_name, config, key, levels):
+        level = config.get(key)
+        if level is not None and str(level).lower() not in levels:
+            raise ValueError("Unknown %s '%s' of table '%s', expected one of: %s." % (key, level, table_name, ', '.join(sorted(levels))))
+        return level and str(level).lower()
+
+    def is_idempotent(self, operation):
+        """
+        Whether a write operation on the table can safely be retried. Reads
+        always are. Unless the idempotent setting says otherwise, all writes
+        are, except for counter increments.
+        """
+        if operation == 'read':
+            return True
+        if self.idempotent is not None:
+            return self.idempotent
+        return operation not in NON_IDEMPOTENT_OPERATIONS
+
+class SchemaCache():
+    """
+    The read-through cache of rows by primary key of a table, from its cache
+    option: true for the defaults, or a mapping with the maximum number of
+    rows (max_size) and the seconds after which a row is read again (ttl).
+    """
+    def __init__(self, table_name, config):
+        config = {} if config is True else config
+        if not isinstance(config, dict):
+            raise ValueError("The cache of table '%s' must be true or a mapping." % table_name)
+        unknown = [key for key in config if key not in ('max_size', 'ttl')]
+        if unknown:
+            raise ValueError("Unknown cache settings of table '%s': %s." % (table_name, ', '.join(unknown)))
+
+        self.max_size = config.get('max_size', 10000)
+        self.ttl = config.get('ttl', 60)
+        for name, value in (('max_size', self.max_size), ('ttl', self.ttl)):
+            if type(value) != int or value <= 0:
+                raise ValueError("The cache %s of table '%s' must be a positive number." % (name, table_name))
+
+class SchemaSizing():
+    """
+    The hints of the sizing section of a table, for ccgen analyze: the
+    number of rows per partition, and the average sizes in bytes (sizes) and
+    number of collection entries (entries) of columns.
+    """
+    def __init__(self, table_name, config, columns):
+        if not isinstance(config, dict):
+            raise ValueError("The sizing of table '%s' must be a mapping." % table_name)
+        unknown = [key for key in config if key not in ('rows_per_partition', 'sizes', 'entries')]
+        if unknown:
+            raise ValueError("Unknown sizing settings of table '%s': %s." % (table_name, ', '.join(unknown)))
+
+        self.rows_per_partition = config.get('rows_per_partition')
+        if self.rows_per_partition is not None and not _is_positive(self.rows_per_partition):
+            raise ValueError("The rows_per_partition of table '%s' must be a positive number." % table_name)
+
+        self.sizes = self._hints(table_name, config, 'sizes', columns)
+        self.entries = self._hints(table_name, config, 'entries', columns)
+
+    @staticmethod
+    def _hints(table_name, config, key, columns):
+        hints = config.get(key, {})
+        if not isinstance(hints, dict):
+            raise ValueError("The sizing %s of table '%s' must be a mapping of columns to numbers." % (key, table_name))
+        unknown = [name for name in hints if name not in columns]
+        if unknown:
+            raise ValueError("Sizing hints of table '%s' for unknown columns: %s." % (table_name, ', '.join(unknown)))
+        invalid = [name for name, value in hints.items() if not _is_positive(value)]
+        if invalid:
+            raise ValueError("The sizing %s of table '%s' must be positive numbers, not for: %s." % (key, table_name, ', '.join(invalid)))
+        return dict(hints)
+
+def _is_positive(value):
+    return type(value) == int and value > 0
+
+class SchemaTable():
+    """
+    A table of the schema. Query tables and materialized views, declared in
+    the query_tables of a table, are tables of their own, with the name of
+    that table as source.
+    """
+    def __init__(self, name, config, source=None):
+        self.name = name
+        self.config = config
+        self.source = source
+        self.is_view = bool(config.get('materialized_view', False))
+        self.query_tables = list(config.get('query_tables', {}).keys())
+        self.fields = []
+        self.partition_key = list(config['partition_key'])
+        self.clustering = list(config.get('clustering', {}).items())
+        self.options = list(config.get('options', {}).items())
+        self.projections = OrderedDict((name, list(columns)) for name, columns in config.get('projections', {}).items())
+        self.execution = SchemaExecution(name, config.get('execution', {}))
+        self.cache = SchemaCache(name, config['cache']) if config.get('cache') else None
+        self.sizing = SchemaSizing(name, config.get('sizing', {}), config['fields'])
+
+    @property
+    def clustering_key(self):
+        return [field_name for field_name, _ in self.clustering]
+
+    @property
+    def is_counter(self):
+        """Whether all non-key columns of the table are counters."""
+        columns = [field for field in self.fields if not self.is_key(field.name)]
+        return len(columns) > 0 and all(field.schema_type.name == 'counter' for field in columns)
+
+    def is_key(self, field_name):
+        return field_name in self.partition_key or field_name in self.clustering_key
+
+class Schema():
+    """
+    The parsed and resolved contents of a single YAML schema file. It is
+    built once per file and shared by all generators.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.options = config['options']
+        self.types = OrderedDict()
+        self.tables = OrderedDict()
+        self._resolved = {}
+
+        for type_name, type_config in config.get('types', {}).items():
+            self.types[type_name] = SchemaUserType(type_name, type_config)
+
+        for user_type in self.types.values():
+            for field_name, type_config in user_type.config.items():
+                user_type.fields.append(SchemaField(field_name, self._resolve(type_config, "type '%s'" % user_type.name)))
+        self._check_cycles()
+
+        for table_name, table_config in config.get('tables', {}).items():
+            table = self._add_table(table_name, table_config)
+            for query_name, query_config in table_config.get('query_tables', {}).items():
+                if table.is_counter:
+                    raise ValueError("Counter table '%s' can not have query tables, as increments can not be written twice safely." % table_name)
+                self._add_table(query_name, self._query_table_config(table, query_name, query_config), table_name)
+
+    def _add_table(self, table_name, table_config, source=None):
+        if table_name in self.tables:
+            raise ValueError("Table '%s' is defined more than once." % table_name)
+        table = SchemaTable(table_name, table_config, source)
+        for field_name, type_config in table_config['fields'].items():
+            table.fields.append(SchemaField(field_name, self._resolve(type_config, "table '%s'" % table_name)))
+        if not table.is_counter and any(field.schema_type.name == 'counter' for field in table.fields):
+            raise ValueError("Table '%s' mixes counter and non-counter columns, counters must be the only non-key columns of a table." % table_name)
+        for projection, columns in table.projections.items():
+            unknown = [column for column in columns if column not in table_config['fields']]
+            if unknown:
+                raise ValueError("Projection '%s' of table '%s' has unknown columns: %s." % (projection, table_name, ', '.join(unknown)))
+        self.tables[table_name] = table
+        return table
+
+    def _query_table_config(self, table, name, config):
+        """
+        The table configuration of a query table of table: its own primary
+        key, and the fields it carries (all fields of table by default) plus
+        the primary key columns of both tables, in the order of table.
+        """
+        unknown = [key for key in config if key not in (
+            'partition_key', 'clustering', 'fields', 'options', 'materialized_view', 'execution', 'cache', 'sizing')]
+        if unknown:
+            raise ValueError("Unknown settings of query table '%s': %s." % (name, ', '.join(unknown)))
+
+        key = list(config['partition_key']) + list(config.get('clustering', {}).keys())
+        base_key = table.partition_key + table.clustering_key
+        carried = list(config.get('fields', table.config['fields'].keys()))
+        unknown = [column for column in key + carried if column not in table.config['fields']]
+        if unknown:
+            raise ValueError("Query table '%s' of table '%s' has unknown columns: %s." % (name, table.name, ', '.join(unknown)))
+
+        if config.get('materialized_view', False):
+            missing = [column for column in base_key if column not in key]
+            extra = [column for column in key if column not in base_key]
+            if missing or len(extra) > 1:
+                raise ValueError(
+                    "The primary key of materialized view '%s' must contain all primary key columns of table '%s', and at most one other column."
+                    % (name, table.name))
+
+        columns = set(key + base_key + carried)
+        result = OrderedDict([
+            ('fields', OrderedDict((field_name, type_config) for field_name, type_config in table.config['fields'].items() if field_name in columns)),
+            ('partition_key', list(config['partition_key'])),
+            ('clustering', config.get('clustering', OrderedDict())),
+            ('options', config.get('options', OrderedDict())),
+            ('execution', config.get('execution', table.config.get('execution', {}))),
+        ])
+        for setting in ('materialized_view', 'cache', 'sizing'):
+            if setting in config:
+                result[setting] = config[setting]
+        return result
+
+    @staticmethod
+    def load(yaml_file):
+        return Schema(Schema.read_config(yaml_file))
+
+    @staticmethod
+    def read_config(yaml_file):
+        """The parsed, but not yet resolved, contents of a YAML (or JSON) schema file."""
+        with open(yaml_file, 'r') as f:
+            return yaml.load(f, Loader=OrderedDictYAMLLoader)
+
+    def _deep_config(self, type_config):
+        return { 'type': type_config } if str == type(type_config) else type_config
+
+    def _resolve(self, input_config, owner):
+        config = self._deep_config(input_config)
+        name = config['type']
+
+        if name in self.types:
+            return self._intern(name, is_user_defined=True)
+        elif name in ('list', 'set'):
+            return self._intern(name, entries=self._resolve(config['entries'], owner))
+        elif name == 'map':
+            return self._intern(name, keys=self._resolve(config['keys'], owner), values=self._resolve(config['values'], owner))
+        elif name in CQL_TYPES:
+            return self._intern(name)
+        else:
+            raise ValueError("Unknown type '%s' in %s, expected a CQL type or a user defined type." % (name, owner))
+
+    def _intern(self, name, **kwargs):
+        key = SchemaType.key_of(name, kwargs.get('entries'), kwargs.get('keys'), kwargs.get('values'))
+        if key not in self._resolved:
+            self._resolved[key] = SchemaType(name, **kwargs)
+        return self._resolved[key]
+
+    def _check_cycles(self):
+        """
+        User defined types can not contain themselves, directly or through
+        other types, as such values could never be written.
+        """
+        done = set()
+
+        def visit(name, path):
+            if name in path:
+                cycle = path[path.index(name):] + [name]
+                raise ValueError("User defined type '%s' contains itself: %s." % (name, ' -> '.join(cycle)))
+            if name not in done:
+                for field in self.types[name].fields:
+                    for referenced in field.schema_type.user_types:
+                        visit(referenced, path + [name])
+                done.add(name)
+
+        for name in self.types:
+            visit(name, [])
@@ -0,0 +1,92 @@
+import json
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+PHASES = ('load', 'resolve', 'render', 'write')
+
+class Timings():
+    """
+    Time spent per phase of a run, per input file and per output file, in
+    milliseconds. Instances are filled in by (worker processes running)
+    _generate and merged into a single instance for the whole run.
+    """
+    def __init__(self):
+        self.inputs = OrderedDict()
+        self.outputs = OrderedDict()
+        self.wall = None
+
+    @contextmanager
+    def measure(self, input_file, phase, output=None, template=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            phases = self.inputs.setdefault(input_file, OrderedDict())
+            phases[phase] = phases.get(phase, 0) + elapsed
+            if output is not None:
+                entry = self.outputs.setdefault(output, OrderedDict([('input', input_file)]))
+                if template is not None:
+                    entry['template'] = template
+                entry[phase] = entry.get(phase, 0) + elapsed
+
+    def merge(self, other):
+        for input_file, phases in other.inputs.items():
+            mine = self.inputs.setdefault(input_file, OrderedDict())
+            for phase, elapsed in phases.items():
+                mine[phase] = mine.get(phase, 0) + elapsed
+        for output, entry in other.outputs.items():
+            mine = self.outputs.setdefault(output, OrderedDict())
+            for key, value in entry.items():
+                mine[key] = mine.get(key, 0) + value if key in PHASES else value
+
+    @property
+    def phases(self):
+        return OrderedDict((phase, sum(phases.get(phase, 0) for phases in self.inputs.values())) for phase in PHASES)
+
+    @property
+    def templates(self):
+        result = OrderedDict()
+        for entry in self.outputs.values():
+            if 'template' in entry:
+                template = result.setdefault(entry['template'], OrderedDict([('files', 0), ('render', 0)]))
+                template['files'] += 1
+                template['render'] += entry.get('render', 0)
+        return result
+
+    def to_json(self):
+        def rounded(mapping):
+            return OrderedDict((key, round(value, 3) if isinstance(value, float) else value) for key, value in mapping.items())
+
+        return json.dumps(OrderedDict([
+            ('unit', 'ms'),
+            ('wall', round(self.wall, 3) if self.wall is not None else None),
+            ('phases', rounded(self.phases)),
+            ('inputs', OrderedDict((input_file, rounded(phases)) for input_file, phases in self.inputs.items())),
+            ('templates', OrderedDict((template, rounded(entry)) for template, entry in self.templates.items())),
+            ('outputs', OrderedDict((output, rounded(entry)) for output, entry in self.outputs.items())),
+        ]), indent=2)
+
+    def report(self, top=10):
+        lines = ['ccgen timings (ms):']
+        if self.wall is not None:
+            lines.append('  %10.1f  wall clock' % self.wall)
+        for phase, elapsed in self.phases.items():
+            lines.append('  %10.1f  %s' % (elapsed, phase))
+
+        lines.append('slowest inputs:')
+        for input_file, phases in sorted(self.inputs.items(), key=lambda item: -sum(item[1].values()))[:top]:
+            lines.append('  %10.1f  %s (%s)' % (
+                sum(phases.values()), input_file, ', '.join('%s %.1f' % (phase, phases[phase]) for phase in PHASES if phase in phases)))
+
+        lines.append('slowest outputs to render:')
+        for output, entry in sorted(self.outputs.items(), key=lambda item: -item[1].get('render', 0))[:top]:
+            lines.append('  %10.1f  %s (%s)' % (entry.get('render', 0), output, entry.get('template', '')))
+
+        lines.append('templates:')
+        for template, entry in sorted(self.templates.items(), key=lambda item: -item[1]['render']):
+            lines.append('  %10.1f  %s (%d files)' % (entry['render'], template, entry['files']))
+
+        return '\n'.join(lines)
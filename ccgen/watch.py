@@ -0,0 +1,211 @@
+import os
+import sys
+import time
+
+from collections import OrderedDict
+
+from . import ccgen
+from .output import write_atomic, write_srcjar
+
+# Seconds between checks for changes to the input files and templates.
+POLL_INTERVAL = 0.25
+
+def changed_definitions(previous, schema):
+    """
+    The types and tables that were added, removed or changed between two
+    versions of a schema, as ('type', name) and ('table', name) tuples. None
+    when the options changed, which affects all definitions.
+    """
+    if previous.options != schema.options:
+        return None
+
+    changed = set()
+    for kind, before, after in (('type', previous.types, schema.types), ('table', previous.tables, schema.tables)):
+        for name in set(before) | set(after):
+            if name not in before or name not in after or before[name].config != after[name].config:
+                changed.add((kind, name))
+    return changed
+
+def affected_definitions(schema, changed):
+    """
+    The changed definitions, plus the types and tables that use one of the
+    changed types, directly or through other types.
+    """
+    users = {}
+    for user_type in schema.types.values():
+        for field in user_type.fields:
+            for name in field.schema_type.user_types:
+                users.setdefault(name, set()).add(('type', user_type.name))
+    for table in schema.tables.values():
+        for field in table.fields:
+            for name in field.schema_type.user_types:
+                users.setdefault(name, set()).add(('table', table.name))
+
+    result = set(changed)
+    pending = [name for kind, name in changed if kind == 'type']
+    while pending:
+        for user in users.get(pending.pop(), ()):
+            if user not in result:
+                result.add(user)
+                if user[0] == 'type':
+                    pending.append(user[1])
+    return result
+
+def _unchanged_on_disk(path, contents):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read() == contents
+    except (OSError, UnicodeDecodeError):
+        return False
+
+class _WatchedInput():
+    """A watched input file, with its last loaded schema and outputs."""
+    def __init__(self, fn):
+        self.fn = fn
+        self.mtime = None
+        self.schema = None
+        self.outputs = OrderedDict()
+
+class Watcher():
+    """
+    Regenerates the outputs of the input files whenever the files or the
+    templates change, until interrupted. Schemas and compiled templates are
+    kept in memory between changes, and only the outputs generated from
+    changed types and tables, and from the types and tables that use the
+    changed types, are rendered again. Outputs that depend on the schema
+    as a whole, like the CQL file, are always rendered again. A change to a
+    template renders everything.
+
+    Errors in an input file are reported, and its previous outputs are kept
+    until the next change to it. The same goes for an input file whose
+    outputs conflict with those of another input file.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.java_dir = ccgen.SRCJAR_ROOT if args.srcjar else args.java
+        self.inputs = [_WatchedInput(fn) for fn in OrderedDict.fromkeys(args.files)]
+        self.template_mtimes = None
+
+    def run(self):
+        self.poll()
+        print('ccgen: watching %d files for changes, press Ctrl-C to stop' % len(self.inputs), file=sys.stderr)
+        try:
+            while True:
+                time.sleep(POLL_INTERVAL)
+                self.poll()
+        except KeyboardInterrupt:
+            pass
+
+    def poll(self):
+        """Regenerates whatever changed since the previous poll. Returns the paths of the rendered outputs."""
+        template_mtimes = { name: os.stat(os.path.join(ccgen.TEMPLATE_DIR, name)).st_mtime_ns for name in os.listdir(ccgen.TEMPLATE_DIR) }
+        templates_changed = template_mtimes != self.template_mtimes
+        self.template_mtimes = template_mtimes
+
+        regenerated = []
+        for watched in self.inputs:
+            try:
+                mtime = os.stat(watched.fn).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == watched.mtime and not templates_changed:
+                continue
+            watched.mtime = mtime
+
+            start = time.perf_counter()
+            try:
+                result = self._regenerate(watched, templates_changed)
+            except Exception as e:
+                print('ccgen: error: %s: %s' % (watched.fn, e), file=sys.stderr)
+                continue
+            if result is not None:
+                regenerated.append((watched, start) + result)
+
+        joined_cql = ccgen._joined_cql(self.args)
+        if regenerated:
+            current = { watched: outputs for watched, _, _, outputs, _ in regenerated }
+            conflicts = ccgen._conflicts(
+                (watched.fn, [path for path in current.get(watched, watched.outputs) if os.path.normpath(path) != joined_cql]) for watched in self.inputs)
+            if conflicts:
+                print('ccgen: error: %s' % ccgen._conflicts_message(conflicts), file=sys.stderr)
+                conflicting = set(fn for _, owner, fn in conflicts) | set(owner for _, owner, fn in conflicts)
+                regenerated = [entry for entry in regenerated if entry[0].fn not in conflicting]
+
+        rendered_paths = []
+        srcjar_changed = False
+        cql_changed = False
+        for watched, start, schema, outputs, rendered in regenerated:
+            written = 0
+            for path, contents in outputs.items():
+                if path in watched.outputs and watched.outputs[path] == contents:
+                    continue
+                if self.args.srcjar and ccgen._in_srcjar(path):
+                    srcjar_changed = True
+                elif os.path.normpath(path) == joined_cql:
+                    cql_changed = True
+                elif path in watched.outputs or not _unchanged_on_disk(path, contents):
+                    write_atomic(path, contents)
+                    written += 1
+            for path in watched.outputs:
+                if path not in outputs:
+                    if self.args.srcjar and ccgen._in_srcjar(path):
+                        srcjar_changed = True
+                    elif os.path.normpath(path) == joined_cql:
+                        cql_changed = True
+                    elif os.path.exists(path):
+                        os.remove(path)
+
+            watched.schema = schema
+            watched.outputs = outputs
+            rendered_paths.extend(rendered)
+            print('ccgen: %s: rendered %d of %d outputs and wrote %d in %.1f ms' % (
+                watched.fn, len(rendered), len(outputs), written, (time.perf_counter() - start) * 1000), file=sys.stderr)
+
+        if srcjar_changed:
+            write_srcjar(self.args.srcjar, [
+                (os.path.relpath(path, ccgen.SRCJAR_ROOT), contents)
+                for watched in self.inputs for path, contents in watched.outputs.items() if ccgen._in_srcjar(path)])
+        if cql_changed:
+            write_atomic(self.args.cql, ccgen._join_cql(
+                contents for watched in self.inputs for path, contents in watched.outputs.items() if os.path.normpath(path) == joined_cql))
+
+        return rendered_paths
+
+    def _regenerate(self, watched, templates_changed):
+        """
+        Loads the input file and renders the outputs that are affected by
+        the changes since it was loaded before. Returns the schema, all
+        outputs by path and the rendered paths, or None when the schema
+        did not change.
+        """
+        from .schema import Schema
+
+        args = self.args
+        schema = Schema.load(watched.fn)
+        if watched.schema is None or templates_changed:
+            affected = None
+        elif schema.config == watched.schema.config and not args.migrate_from:
+            return None
+        else:
+            changed = changed_definitions(watched.schema, schema)
+            affected = None if changed is None else affected_definitions(schema, changed)
+
+        previous = ccgen._previous_schema(watched.fn, schema, args.migrate_from) if args.migrate_from else None
+        generators = ccgen._generators(watched.fn, schema, args.cql, self.java_dir, previous, args.migration, args.python)
+
+        env = ccgen._env()
+        outputs = OrderedDict()
+        rendered = []
+        for generator in generators:
+            for f in generator.files:
+                path = os.path.join(f.directory, f.name)
+                if affected is None or f.sources is None or path not in watched.outputs or not affected.isdisjoint(f.sources):
+                    outputs[path] = ccgen._render_file(env, generator, f)
+                    rendered.append(path)
+                else:
+                    outputs[path] = watched.outputs[path]
+
+        if args.snapshot:
+            outputs[ccgen._output_path(args.snapshot, watched.fn)] = ccgen._snapshot(schema)
+
+        return schema, outputs, rendered
@@ -1,12 +1,763 @@
 import unittest
+import io
+import contextlib
 import yaml
+import json
 import os
+import sys
+import shutil
+import tempfile
+import zipfile
+import subprocess
 
 from ccgen import ccgen
+from ccgen.schema import Schema
+
+TABLES_YAML = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'tables.yaml')
 
 class TestCCGen(unittest.TestCase):
     
     def test_generate_cql_code(self):
-        file_name = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'tables.yaml')
-        input = yaml.load(open(file_name, 'r'))
-        result = ccgen.generate_cql(input)
+        result = _generate()['create-tables.cql']
+
+        self.assertTrue(result.startswith('USE example;'))
+        self.assertIn('CREATE TYPE bar_type (\n  foo varchar,\n  bar int,\n  nested frozen<nested_type>\n);', result)
+        self.assertIn('  PRIMARY KEY ((varchar_field, int_field), timestamp_field, uuid_field)', result)
+        self.assertIn('CLUSTERING ORDER BY (timestamp_field DESC, uuid_field ASC)', result)
+
+class TestSchema(unittest.TestCase):
+
+    def test_load_keeps_ordering_and_resolves_types(self):
+        schema = Schema.load(TABLES_YAML)
+
+        self.assertEqual(['nested_type', 'bar_type'], list(schema.types.keys()))
+        self.assertEqual(['basic_table', 'udt_table', 'no_clustering', 'no_options'], list(schema.tables.keys()))
+
+        map_field = [f for f in schema.tables['basic_table'].fields if f.name == 'map_field'][0]
+        self.assertEqual('map', map_field.schema_type.name)
+        self.assertEqual('varchar', map_field.schema_type.keys.name)
+        self.assertTrue(map_field.schema_type.values.is_user_defined)
+
+    def test_equal_types_are_resolved_once(self):
+        schema = Schema.load(TABLES_YAML)
+
+        fields = { f.name: f.schema_type for f in schema.tables['basic_table'].fields }
+        self.assertIs(fields['varchar_field'], schema.types['bar_type'].fields[0].schema_type)
+        self.assertIs(fields['varchar_field'], fields['list_field'].entries)
+        self.assertEqual('map<varchar,nested_type>', fields['map_field'].key)
+
+    def test_unknown_types_are_rejected(self):
+        with self.assertRaises(ValueError):
+            Schema(yaml.safe_load(COUNTER_YAML.replace('page: varchar', 'page: string')))
+
+    def test_cyclic_types_are_rejected(self):
+        config = yaml.safe_load(COUNTER_YAML)
+        config['types'] = { 'a': { 'b': 'b' }, 'b': { 'values': { 'type': 'list', 'entries': 'a' } } }
+        with self.assertRaisesRegex(ValueError, 'a -> b -> a'):
+            Schema(config)
+
+    def test_projections_must_use_known_columns(self):
+        with self.assertRaises(ValueError):
+            Schema(yaml.safe_load(COUNTER_YAML.replace('    partition_key:', '    projections:\n      views: [page, clicks]\n    partition_key:')))
+
+    def test_counters_cannot_be_mixed_with_other_columns(self):
+        with self.assertRaises(ValueError):
+            Schema(yaml.safe_load(COUNTER_YAML.replace('visitors: counter', 'visitors: int')))
+
+    def test_cache_settings_are_checked(self):
+        with self.assertRaisesRegex(ValueError, "The cache ttl of table 'page_views' must be a positive number."):
+            Schema(yaml.safe_load(COUNTER_YAML + '    cache:\n      ttl: 0\n'))
+
+    def test_sizing_hints_are_checked(self):
+        with self.assertRaisesRegex(ValueError, "The rows_per_partition of table 'page_views' must be a positive number."):
+            Schema(yaml.safe_load(COUNTER_YAML + '    sizing:\n      rows_per_partition: many\n'))
+        with self.assertRaisesRegex(ValueError, "The sizing sizes of table 'page_views' must be positive numbers, not for: page."):
+            Schema(yaml.safe_load(COUNTER_YAML + '    sizing:\n      sizes:\n        page: 20 bytes\n'))
+        with self.assertRaisesRegex(ValueError, "Sizing hints of table 'page_views' for unknown columns: day."):
+            Schema(yaml.safe_load(COUNTER_YAML + '    sizing:\n      entries:\n        day: 10\n'))
+
+    def test_unknown_consistency_levels_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "Unknown serial_consistency 'quorum' of table 'page_views'"):
+            Schema(yaml.safe_load(COUNTER_YAML + '    execution:\n      serial_consistency: quorum\n'))
+
+COUNTER_YAML = """
+options:
+  package: com.example.cassandra
+  keyspace: example
+tables:
+  page_views:
+    fields:
+      page: varchar
+      views: counter
+      visitors: counter
+    partition_key:
+      - page
+"""
+
+def _generate(yaml_file=TABLES_YAML):
+    """Returns the generated sources of yaml_file by file name."""
+    return { os.path.basename(path): contents for path, contents in ccgen._generate(yaml_file, 'create-tables.cql', 'java') }
+
+def _generate_from(schema):
+    """Returns the generated sources of a schema given as YAML text."""
+    with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+        f.write(schema)
+    try:
+        return _generate(f.name)
+    finally:
+        os.remove(f.name)
+
+def _tables_yaml(extra_options=''):
+    with open(TABLES_YAML, 'r') as f:
+        return f.read().replace('  keyspace: example\n', '  keyspace: example\n' + extra_options)
+
+class TestJava(unittest.TestCase):
+
+    def test_prepared_statements_are_cached_per_session(self):
+        sources = _generate()
+
+        self.assertIn('preparedStatements.computeIfAbsent(session, PreparedStatements::new)', sources['UdtTable.java'])
+        self.assertIn('statement.setUDTValue("bar", bar.toUDTValue(prepared.barType));', sources['UdtTable.java'])
+        self.assertIn('nested.toUDTValue((UserType) type.getFieldType("nested"))', sources['BarType.java'])
+
+    def test_streaming_and_paging(self):
+        source = _generate()['NoOptions.java']
+
+        self.assertIn('return ImmutableList.copyOf(iterator(result));', source)
+        self.assertIn('result.fetchMoreResults();', source)
+        self.assertIn('public static Stream<NoOptions> stream(final ResultSet result)', source)
+        self.assertIn('public static ListenableFuture<Page> pageAsync(', source)
+        self.assertIn('public static ListenableFuture<NoOptions> oneAsync(', source)
+
+    def test_batch_writer_groups_by_partition_key(self):
+        source = _generate()['BasicTable.java']
+
+        self.assertIn('java.util.Arrays.<Object>asList(row.varcharField, row.intField)', source)
+        self.assertIn('new BatchStatement(BatchStatement.Type.UNLOGGED)', source)
+
+    def test_token_range_scan_uses_partition_key_order(self):
+        source = _generate()['BasicTable.java']
+
+        self.assertIn('.where(gt(token("varchar_field", "int_field"), bindMarker()))', source)
+        self.assertIn('public static java.util.List<long[]> tokenRanges(final int splits)', source)
+
+    def test_null_values_are_not_written(self):
+        source = _generate()['UdtTable.java']
+
+        self.assertIn('if (bar != null) {\n            insert.value("bar", bar.toUDTValue(prepared.barType));\n        }', source)
+        self.assertIn('insert.value("foo", foo);', source)
+        self.assertIn('prepared.update(session, (java.util.BitSet) present.clone())', source)
+        self.assertIn('statement.setUDTValue("bar", bar == null ? null : bar.toUDTValue(prepared.barType));', source)
+
+    def test_user_types_are_looked_up_once(self):
+        source = _generate()['UdtTable.java']
+
+        self.assertNotIn('final KeyspaceMetadata meta = session.getCluster().getMetadata().getKeyspace("example");', source)
+        self.assertIn('this.barType = meta.getUserType("bar_type");', source)
+        self.assertIn('    public Statement delete(final Session session) {\n        return writeStatement(QueryBuilder', source)
+
+        # Without user types, nothing is looked up.
+        source = _generate()['BasicTable.java']
+        self.assertNotIn('KeyspaceMetadata meta', source)
+
+    def test_write_shapes_are_bounded(self):
+        source = _generate()['UdtTable.java']
+
+        self.assertIn('.maximumSize(maxPreparedShapes)', source)
+        self.assertIn('final PreparedStatement statement = session.prepare(insertOf(present));\n'
+                      '            final PreparedStatement previous = inserts.asMap().putIfAbsent(present, statement);', source)
+        self.assertNotIn('inserts.computeIfAbsent', source)
+
+        # The statements are prepared the same way with driver 3.x codecs.
+        source = _generate_from(_tables_yaml('  codecs: true\n'))['UdtTable.java']
+        self.assertIn('.maximumSize(maxPreparedShapes)', source)
+        self.assertIn('final PreparedStatement statement = session.prepare(insertOf(present));', source)
+
+    def test_counter_tables_are_incremented(self):
+        source = _generate_from(COUNTER_YAML)['PageViews.java']
+
+        self.assertNotIn('insertPrepared', source)
+        self.assertNotIn('set("views"', source)
+        self.assertIn('.with(incr("views", bindMarker("views")))', source)
+        self.assertIn('public void increment(final String page, final long views, final long visitors)', source)
+        self.assertIn('this.views += row.views;', source)
+
+    def test_execution_settings(self):
+        sources = _generate_from(COUNTER_YAML + '    execution:\n      fetch_size: 500\n      write_consistency: local_quorum\n')['PageViews.java']
+
+        self.assertIn('        statement.setFetchSize(500);\n        statement.setIdempotent(true);\n', sources)
+        self.assertIn('        statement.setConsistencyLevel(ConsistencyLevel.LOCAL_QUORUM);\n        statement.setIdempotent(idempotent);\n', sources)
+        self.assertIn('writeStatement(prepared.increment.bind(), false)', sources)
+        self.assertIn('writeStatement(prepared.delete.bind(), true)', sources)
+
+        self.assertIn('writeStatement(prepared.insert(session, present()).bind(), true)', _generate()['BasicTable.java'])
+
+    def test_row_cache(self):
+        source = _generate_from(COUNTER_YAML + '    cache:\n      max_size: 500\n')['PageViews.java']
+
+        self.assertIn('    public static final class Key {', source)
+        self.assertIn('.maximumSize(500)\n            .expireAfterWrite(60, java.util.concurrent.TimeUnit.SECONDS)', source)
+        self.assertIn('this.get = session.prepare(select(session)\n                    .where(eq("page", bindMarker("page"))));', source)
+        self.assertEqual(4, source.count('rowCache.invalidate(key());'))
+        self.assertIn('Futures.addCallback(rowCache.executeAsync(session, key, statement), new FutureCallback<ResultSet>() {', source)
+        self.assertNotIn('rowCache', _generate()['BasicTable.java'])
+
+        source = _generate_from(QUERY_YAML.replace('    partition_key:\n      - id\n', '    partition_key:\n      - id\n    cache: true\n'))['Users.java']
+        self.assertIn('future.addListener(() -> rows.invalidate(key), Runnable::run);', source)
+        self.assertIn('future.addListener(() -> batch.keys.forEach(rowCache::invalidate), Runnable::run);', source)
+        self.assertIn('Users.cache().executeAsync(session, key(), insertPrepared(session)),', source)
+
+    def test_user_types_are_compared_by_value(self):
+        source = _generate()['BarType.java']
+
+        self.assertIn('return java.util.Objects.equals(foo, other.foo)\n            && java.util.Objects.equals(bar, other.bar)', source)
+        self.assertIn('return java.util.Objects.hash(foo, bar, nested);', source)
+
+    def test_projections(self):
+        source = _generate_from(COUNTER_YAML.replace('    partition_key:', '    projections:\n      views: [page, views]\n    partition_key:'))['PageViews.java']
+
+        self.assertIn('public static final class Views {', source)
+        self.assertIn('.select()\n              .column("page")\n              .column("views")\n              .from(keyspace, table));', source)
+        self.assertIn('return mappedIterator(result, Views::fromRow);', source)
+
+    def test_projection_names_must_not_clash(self):
+        for name in ('page', 'key', 'page_views', 'session'):
+            with self.assertRaisesRegex(ValueError, "Projection '%s' of table 'page_views' clashes with the Java class" % name):
+                _generate_from(COUNTER_YAML.replace('    partition_key:', '    projections:\n      %s: [page, views]\n    partition_key:' % name))
+
+    def test_floats_are_read_as_floats(self):
+        source = _generate()['BasicTable.java']
+
+        self.assertIn('row.getFloat("float_field")', source)
+        self.assertIn('statement.setFloat("float_field", floatField);', source)
+
+    def test_custom_java_types(self):
+        sources = _generate_from(_tables_yaml(
+            '  java_types:\n'
+            '    timestamp: { type: java.util.Date, getter: getDate, setter: setDate }\n'))
+
+        self.assertIn('public final java.util.Date timestampField;', sources['BasicTable.java'])
+        self.assertIn('row.getDate("timestamp_field")', sources['BasicTable.java'])
+        self.assertIn('statement.setDate("timestamp_field", timestampField);', sources['BasicTable.java'])
+
+    def test_codecs(self):
+        sources = _generate_from(_tables_yaml('  codecs: true\n'))
+
+        self.assertIn('registry.register(new BarTypeCodec(meta.getUserType("bar_type"), registry));', sources['ExampleCodecs.java'])
+        self.assertIn('this.nestedCodec = registry.codecFor(userType.getFieldType("nested"), new TypeToken<NestedType>() {});', sources['BarTypeCodec.java'])
+        self.assertIn('row.get("bar", BarType.class)', sources['UdtTable.java'])
+        self.assertIn('row.get("timestamp_field", java.time.Instant.class)', sources['BasicTable.java'])
+        self.assertNotIn('ExampleCodecs.java', _generate())
+
+    def test_index_row_mapping(self):
+        sources = _generate_from(_tables_yaml('  row_mapping: index\n'))
+
+        self.assertIn('.column("foo")\n          .column("bar")\n          .from(keyspace, table)', sources['UdtTable.java'])
+        self.assertIn('new BarType(row.getUDTValue(1))', sources['UdtTable.java'])
+        self.assertIn('this.nested = new NestedType(value.getUDTValue(2));', sources['BarType.java'])
+        self.assertNotIn('row.getString(0)', _generate()['UdtTable.java'])
+
+QUERY_YAML = """
+options:
+  package: com.example.cassandra
+  keyspace: example
+tables:
+  users:
+    fields:
+      id: uuid
+      email: text
+      country: text
+      name: text
+    partition_key:
+      - id
+    query_tables:
+      users_by_email:
+        partition_key:
+          - email
+        fields: [name]
+      users_by_country:
+        materialized_view: true
+        partition_key:
+          - country
+        clustering:
+          id: asc
+"""
+
+class TestQueryTables(unittest.TestCase):
+
+    def test_query_tables_and_views_are_created(self):
+        result = _generate_from(QUERY_YAML)['create-tables.cql']
+
+        self.assertIn('CREATE TABLE users_by_email (\n  id uuid,\n  email text,\n  name text,\n  PRIMARY KEY ((email))\n);', result)
+        self.assertIn(
+            'CREATE MATERIALIZED VIEW users_by_country AS\n'
+            '  SELECT id, email, country, name\n'
+            '  FROM users\n'
+            '  WHERE country IS NOT NULL AND id IS NOT NULL\n'
+            '  PRIMARY KEY ((country), id)\n', result)
+
+    def test_view_keys_are_checked(self):
+        with self.assertRaisesRegex(ValueError, "materialized view 'users_by_country' must contain all primary key columns of table 'users'"):
+            Schema(yaml.safe_load(QUERY_YAML.replace('          id: asc', '          email: asc')))
+        with self.assertRaisesRegex(ValueError, "Counter table 'page_views' can not have query tables"):
+            Schema(yaml.safe_load(COUNTER_YAML + '    query_tables:\n      views_by_page:\n        partition_key: [page]\n'))
+
+    def test_writes_fan_out_to_query_tables(self):
+        sources = _generate_from(QUERY_YAML)
+
+        self.assertIn('return new UsersByEmail(id, email, name);', sources['Users.java'])
+        self.assertIn(
+            '        final UsersByEmail row1 = toUsersByEmail();\n'
+            '        return Futures.allAsList(\n'
+            '            session.executeAsync(insertPrepared(session)),\n'
+            '            session.executeAsync(row1.insertPrepared(session)));', sources['Users.java'])
+        self.assertNotIn('toUsersByCountry', sources['Users.java'])
+        self.assertIn('public static Select.Where selectPartition(final Session session, final String email)', sources['UsersByEmail.java'])
+        self.assertIn('public BoundStatement insertPrepared(', sources['UsersByEmail.java'])
+        for write in ('insert(', 'delete(', 'insertPrepared(', 'batchWriter(', 'PreparedStatement delete;'):
+            self.assertNotIn(write, sources['UsersByCountry.java'])
+
+    def test_views_are_not_written_from_python(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+            f.write(QUERY_YAML)
+        try:
+            source = dict(ccgen._generate(f.name, 'create-tables.cql', 'java', python_dir='py'))[os.path.join('py', 'example.py')]
+        finally:
+            os.remove(f.name)
+        view = source[source.index('class UsersByCountry'):]
+
+        self.assertNotIn("'insert'", view)
+        self.assertNotIn('def delete', view)
+        self.assertIn('def partition(cls, session, country, fetch_size=None):', view)
+
+class TestMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _migrate(self, previous, current):
+        previous_file = os.path.join(self.dir, 'previous.yaml')
+        current_file = os.path.join(self.dir, 'current.yaml')
+        for fn, schema in ((previous_file, previous), (current_file, current)):
+            with open(fn, 'w') as f:
+                f.write(schema)
+
+        outputs = ccgen._generate(current_file, 'create-tables.cql', 'java', migrate_from=previous_file, migration='migration.cql')
+        return dict(outputs)[os.path.join('.', 'migration.cql')]
+
+    def test_only_changes_are_migrated(self):
+        current = COUNTER_YAML.replace('      visitors: counter\n', '      visitors: counter\n      clicks: counter\n') + (
+            '  page_visits:\n'
+            '    fields:\n'
+            '      page: varchar\n'
+            '      visits: counter\n'
+            '    partition_key:\n'
+            '      - page\n'
+            '    options:\n'
+            '      comment: Visits.\n')
+        migration = self._migrate(COUNTER_YAML, current)
+
+        self.assertEqual(
+            'USE example;\n'
+            '\n'
+            'CREATE TABLE IF NOT EXISTS page_visits (\n'
+            '  page varchar,\n'
+            '  visits counter,\n'
+            '  PRIMARY KEY ((page))\n'
+            ') WITH\n'
+            '  comment = \'Visits.\';\n'
+            '\n'
+            'ALTER TABLE page_views ADD clicks counter;\n', migration)
+
+    def test_primary_key_changes_are_incompatible(self):
+        current = COUNTER_YAML.replace('      - page\n', '      - page\n    clustering:\n      visitors: asc\n')
+        with self.assertRaisesRegex(ValueError, "primary key .* of table 'page_views'"):
+            self._migrate(COUNTER_YAML, current.replace('visitors: counter', 'visitors: int'))
+
+    def test_views_are_created_and_dropped(self):
+        base = QUERY_YAML[:QUERY_YAML.index('      users_by_country:')]
+
+        migration = self._migrate(base, QUERY_YAML)
+        self.assertIn('CREATE MATERIALIZED VIEW IF NOT EXISTS users_by_country AS\n', migration)
+        self.assertNotIn('CREATE TABLE', migration)
+
+        migration = self._migrate(QUERY_YAML, base)
+        self.assertIn('DROP MATERIALIZED VIEW IF EXISTS users_by_country;', migration)
+        self.assertNotIn('DROP TABLE', migration)
+
+    def test_views_are_created_after_the_columns_they_select(self):
+        base = QUERY_YAML[:QUERY_YAML.index('      users_by_country:')]
+        current = base.replace('      name: text\n', '      name: text\n      age: int\n') + (
+            '      users_by_age:\n'
+            '        materialized_view: true\n'
+            '        partition_key:\n'
+            '          - age\n'
+            '        clustering:\n'
+            '          id: asc\n')
+        migration = self._migrate(base, current)
+
+        self.assertLess(migration.index('ALTER TABLE users ADD age int;'), migration.index('CREATE MATERIALIZED VIEW IF NOT EXISTS users_by_age AS'))
+
+    def test_snapshots_can_be_migrated_from(self):
+        snapshot = os.path.join(self.dir, 'snapshot.json')
+        ccgen._main(['--java', os.path.join(self.dir, 'java'), '--cql', os.path.join(self.dir, 'create-tables.cql'), '--snapshot', snapshot, TABLES_YAML])
+
+        outputs = dict(ccgen._generate(TABLES_YAML, 'create-tables.cql', 'java', migrate_from=snapshot, migration='migration.cql'))
+        self.assertEqual('USE example;\n\n-- The schema is unchanged.\n', outputs[os.path.join('.', 'migration.cql')])
+
+class TestPython(unittest.TestCase):
+
+    def _generate(self, yaml_file=TABLES_YAML):
+        return dict(ccgen._generate(yaml_file, 'create-tables.cql', 'java', python_dir='py'))[os.path.join('py', 'example.py')]
+
+    def test_module_has_slotted_classes(self):
+        module = self._generate()
+
+        compile(module, 'example.py', 'exec')
+        self.assertIn("class BarType(_Row):\n", module)
+        self.assertIn("    __slots__ = ('foo', 'bar', 'nested',)\n", module)
+        self.assertIn("    partition_key = ('varchar_field', 'int_field',)\n", module)
+        self.assertIn("cluster.register_user_type(keyspace, 'bar_type', BarType)", module)
+
+    def test_counter_tables_are_incremented(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+            f.write(COUNTER_YAML)
+        try:
+            module = self._generate(f.name)
+        finally:
+            os.remove(f.name)
+
+        compile(module, 'example.py', 'exec')
+        self.assertIn("'UPDATE example.page_views SET views = views + ?, visitors = visitors + ? WHERE page = ?'", module)
+        self.assertNotIn('def insert(', module)
+
+    def test_reserved_column_names_are_rejected(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+            f.write(COUNTER_YAML.replace('visitors: counter', 'table: counter'))
+        try:
+            with self.assertRaisesRegex(ValueError, "Column 'table' of table 'page_views'"):
+                self._generate(f.name)
+        finally:
+            os.remove(f.name)
+
+class TestAnalyze(unittest.TestCase):
+
+    def test_partition_sizes_are_estimated(self):
+        from ccgen.analyze import Analyzer
+
+        sizing = '    sizing:\n      rows_per_partition: 1000\n      sizes:\n        page: 20\n'
+        table = Analyzer(Schema(yaml.safe_load(COUNTER_YAML.replace('      - page\n', '      - page\n    clustering:\n      day: asc\n').replace('      page: varchar\n', '      page: varchar\n      day: date\n') + sizing))).tables[0]
+
+        self.assertEqual((1000, 2000), (table.rows, table.cells))
+        self.assertEqual(20 + 1000 * (4 + 8 + 8) + 2000 * 8, table.size)
+        self.assertEqual([], table.findings)
+
+    def test_anti_patterns_are_reported(self):
+        from ccgen.analyze import Analyzer
+
+        tables = { table.name: table for table in Analyzer(Schema.load(TABLES_YAML)).tables }
+
+        messages = [finding.message for finding in tables['basic_table'].findings]
+        self.assertTrue(messages[0].startswith('Partitions are unbounded'))
+        self.assertTrue(messages[1].startswith("List column 'list_field'"))
+        self.assertFalse(tables['basic_table'].has_errors)
+
+    def test_invalid_ttls_are_reported(self):
+        from ccgen.analyze import Analyzer
+
+        table = Analyzer(Schema(yaml.safe_load(COUNTER_YAML + '    options:\n      default_time_to_live: "1 day"\n'))).tables[0]
+
+        self.assertEqual(["The default_time_to_live '1 day' is not a number of seconds, Cassandra will reject it."], [finding.message for finding in table.findings])
+
+    def test_exceeded_thresholds_fail(self):
+        self.assertIsNone(ccgen._main(['analyze', TABLES_YAML]))
+        with self.assertRaises(SystemExit) as exit:
+            ccgen._main(['analyze', '--max-partition-mb', '0.00001', TABLES_YAML])
+        self.assertIn('3 tables exceed the partition thresholds', str(exit.exception.code))
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.yaml_file = os.path.join(self.dir, 'tables.yaml')
+        shutil.copy(TABLES_YAML, self.yaml_file)
+        self.java_dir = os.path.join(self.dir, 'java')
+        self.package_dir = os.path.join(self.java_dir, 'com', 'example', 'cassandra')
+        self.cql_file = os.path.join(self.dir, 'cql', 'create-tables.cql')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _run(self):
+        ccgen._main([
+            '--java', self.java_dir,
+            '--cql', self.cql_file,
+            '--manifest', os.path.join(self.dir, 'manifest.json'),
+            self.yaml_file])
+
+    def _mtimes(self):
+        paths = [self.cql_file] + [os.path.join(self.package_dir, n) for n in os.listdir(self.package_dir)]
+        return { path: os.stat(path).st_mtime_ns for path in paths }
+
+    def test_unchanged_schema_is_a_no_op(self):
+        self._run()
+        before = self._mtimes()
+        self._run()
+        self.assertEqual(before, self._mtimes())
+
+    def test_unchanged_outputs_are_not_rewritten(self):
+        self._run()
+        before = self._mtimes()
+        with open(self.yaml_file, 'a') as f:
+            f.write('    options:\n      comment: Changed.\n')
+        self._run()
+        after = self._mtimes()
+
+        self.assertNotEqual(before[self.cql_file], after[self.cql_file])
+        self.assertEqual(before[os.path.join(self.package_dir, 'BasicTable.java')], after[os.path.join(self.package_dir, 'BasicTable.java')])
+
+    def test_removed_tables_are_deleted(self):
+        self._run()
+        with open(self.yaml_file, 'r') as f:
+            schema = f.read()
+        with open(self.yaml_file, 'w') as f:
+            f.write(schema[:schema.index('  no_options:')])
+        self._run()
+
+        self.assertFalse(os.path.exists(os.path.join(self.package_dir, 'NoOptions.java')))
+        self.assertTrue(os.path.exists(os.path.join(self.package_dir, 'NoClustering.java')))
+
+    def test_inputs_are_recorded_by_normalized_path(self):
+        self._run()
+        before = self._mtimes()
+        ccgen._main([
+            '--java', self.java_dir,
+            '--cql', self.cql_file,
+            '--manifest', os.path.join(self.dir, 'manifest.json'),
+            os.path.join(self.dir, '.', 'tables.yaml')])
+
+        self.assertEqual(before, self._mtimes())
+        with open(os.path.join(self.dir, 'manifest.json'), 'r') as f:
+            self.assertEqual(['tables.yaml'], list(json.load(f)['inputs']))
+
+    def test_outputs_of_removed_inputs_are_deleted(self):
+        other_yaml = os.path.join(self.dir, 'counters.yaml')
+        with open(other_yaml, 'w') as f:
+            f.write(COUNTER_YAML)
+        args = ['--java', self.java_dir, '--cql', os.path.join(self.dir, '{name}.cql'), '--manifest', os.path.join(self.dir, 'manifest.json')]
+        ccgen._main(args + [self.yaml_file, other_yaml])
+        self.assertTrue(os.path.exists(os.path.join(self.package_dir, 'PageViews.java')))
+
+        ccgen._main(args + [self.yaml_file])
+
+        self.assertFalse(os.path.exists(os.path.join(self.package_dir, 'PageViews.java')))
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'counters.cql')))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, 'tables.cql')))
+        with open(os.path.join(self.dir, 'manifest.json'), 'r') as f:
+            self.assertEqual(['tables.yaml'], list(json.load(f)['inputs']))
+
+    def test_runs_from_other_directories_share_the_manifest(self):
+        cwd = os.getcwd()
+        try:
+            os.chdir(self.dir)
+            ccgen._main(['--java', 'java', '--cql', os.path.join('cql', 'create-tables.cql'), '--manifest', 'manifest.json', 'tables.yaml'])
+            before = self._mtimes()
+
+            os.chdir(self.java_dir)
+            ccgen._main(['--java', '.', '--cql', os.path.join('..', 'cql', 'create-tables.cql'), '--manifest', os.path.join('..', 'manifest.json'), os.path.join('..', 'tables.yaml')])
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(before, self._mtimes())
+        with open(os.path.join(self.dir, 'manifest.json'), 'r') as f:
+            self.assertIn(os.path.join('cql', 'create-tables.cql'), json.load(f)['inputs']['tables.yaml']['outputs'])
+
+class TestWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.yaml_file = os.path.join(self.dir, 'tables.yaml')
+        shutil.copy(TABLES_YAML, self.yaml_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _edit(self, old, new):
+        with open(self.yaml_file, 'r') as f:
+            contents = f.read()
+        with open(self.yaml_file, 'w') as f:
+            f.write(contents.replace(old, new))
+        stat = os.stat(self.yaml_file)
+        os.utime(self.yaml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    def test_only_affected_outputs_are_rendered(self):
+        from ccgen.watch import Watcher
+
+        java = os.path.join(self.dir, 'java')
+        watcher = Watcher(ccgen._parse_args(['--watch', '--java', java, '--cql', os.path.join(self.dir, 'create-tables.cql'), self.yaml_file]))
+
+        self.assertEqual(7, len(watcher.poll()))
+        self.assertEqual([], watcher.poll())
+
+        self._edit('    right: boolean\n', '    right: boolean\n    middle: boolean\n')
+        rendered = sorted(os.path.basename(path) for path in watcher.poll())
+        self.assertEqual(['BarType.java', 'BasicTable.java', 'NestedType.java', 'UdtTable.java', 'create-tables.cql'], rendered)
+        with open(os.path.join(java, 'com', 'example', 'cassandra', 'NestedType.java')) as f:
+            self.assertIn('middle', f.read())
+
+        self._edit('  no_options:\n', '  no_options_at_all:\n')
+        self.assertEqual(['NoOptionsAtAll.java', 'create-tables.cql'], sorted(os.path.basename(path) for path in watcher.poll()))
+        self.assertFalse(os.path.exists(os.path.join(java, 'com', 'example', 'cassandra', 'NoOptions.java')))
+
+    def test_conflicting_outputs_are_reported_on_every_change(self):
+        from ccgen.watch import Watcher
+
+        java = os.path.join(self.dir, 'java')
+        other_yaml = os.path.join(self.dir, 'counters.yaml')
+        with open(other_yaml, 'w') as f:
+            f.write(COUNTER_YAML)
+        watcher = Watcher(ccgen._parse_args(['--watch', '--java', java, '--cql', os.path.join(self.dir, '{name}.cql'), self.yaml_file, other_yaml]))
+        watcher.poll()
+
+        with open(other_yaml, 'w') as f:
+            f.write(COUNTER_YAML.replace('page_views', 'basic_table'))
+        stat = os.stat(other_yaml)
+        os.utime(other_yaml, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            self.assertEqual([], watcher.poll())
+
+        self.assertIn('BasicTable.java is generated from both %s and %s' % (self.yaml_file, other_yaml), stderr.getvalue())
+        with open(os.path.join(java, 'com', 'example', 'cassandra', 'BasicTable.java')) as f:
+            self.assertNotIn('increment', f.read())
+        with open(os.path.join(self.dir, 'counters.cql')) as f:
+            self.assertIn('page_views', f.read())
+
+class TestOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_srcjar_contains_all_java_sources(self):
+        srcjar = os.path.join(self.dir, 'generated.srcjar')
+        cql_file = os.path.join(self.dir, 'create-tables.cql')
+        ccgen._main(['--srcjar', srcjar, '--cql', cql_file, TABLES_YAML])
+
+        with zipfile.ZipFile(srcjar) as archive:
+            names = archive.namelist()
+            source = archive.read('com/example/cassandra/BasicTable.java').decode('utf-8')
+
+        self.assertEqual(_generate()['BasicTable.java'], source)
+        self.assertEqual(6, len(names))
+        self.assertEqual(['create-tables.cql', 'generated.srcjar'], sorted(os.listdir(self.dir)))
+
+    def test_srcjar_joins_the_cql_of_all_inputs(self):
+        counter_yaml = os.path.join(self.dir, 'counters.yaml')
+        with open(counter_yaml, 'w') as f:
+            f.write(COUNTER_YAML)
+        srcjar = os.path.join(self.dir, 'generated.srcjar')
+        cql_file = os.path.join(self.dir, 'all.cql')
+        ccgen._main(['--srcjar', srcjar, '--cql', cql_file, TABLES_YAML, counter_yaml])
+
+        with zipfile.ZipFile(srcjar) as archive:
+            self.assertEqual(7, len(archive.namelist()))
+            self.assertIn('com/example/cassandra/PageViews.java', archive.namelist())
+        with open(cql_file, 'r') as f:
+            self.assertEqual(_generate()['create-tables.cql'] + '\n' + _generate(counter_yaml)['create-tables.cql'], f.read())
+        self.assertEqual(['all.cql', 'counters.yaml', 'generated.srcjar'], sorted(os.listdir(self.dir)))
+
+    def test_writes_leave_no_temporary_files(self):
+        java_dir = os.path.join(self.dir, 'java')
+        for _ in range(2):
+            ccgen._main(['--java', java_dir, '--cql', os.path.join(self.dir, 'create-tables.cql'), TABLES_YAML])
+
+        package_dir = os.path.join(java_dir, 'com', 'example', 'cassandra')
+        self.assertEqual(6, len(os.listdir(package_dir)))
+        self.assertEqual([], [name for name in os.listdir(package_dir) if name.startswith('.')])
+
+class TestTimings(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_timings_are_written_as_json(self):
+        timings_file = os.path.join(self.dir, 'timings.json')
+        java_dir = os.path.join(self.dir, 'java')
+        ccgen._main(['--java', java_dir, '--cql', os.path.join(self.dir, 'create-tables.cql'), '--timings-json', timings_file, TABLES_YAML])
+
+        with open(timings_file) as f:
+            timings = json.load(f)
+
+        self.assertEqual(['load', 'resolve', 'render', 'write'], list(timings['phases'].keys()))
+        self.assertEqual([TABLES_YAML], list(timings['inputs'].keys()))
+        self.assertEqual(4, timings['templates']['java_class.j2']['files'])
+        output = timings['outputs'][os.path.join(java_dir, 'com', 'example', 'cassandra', 'BasicTable.java')]
+        self.assertEqual('java_class.j2', output['template'])
+        self.assertIn('render', output)
+        self.assertIn('write', output)
+
+class TestStartup(unittest.TestCase):
+
+    def test_help_does_not_import_heavy_modules(self):
+        script = (
+            'import sys\n'
+            'from ccgen.ccgen import _main\n'
+            'try:\n'
+            '    _main(["--help"])\n'
+            'except SystemExit:\n'
+            '    pass\n'
+            'print(",".join(m for m in ("jinja2", "yaml", "concurrent.futures") if m in sys.modules))\n')
+        root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+        result = subprocess.run([sys.executable, '-c', script], cwd=root, stdout=subprocess.PIPE, check=True)
+
+        self.assertEqual('', result.stdout.decode('utf-8').splitlines()[-1])
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open(TABLES_YAML, 'r') as f:
+            schema = f.read()
+        self.files = []
+        for name in ['first', 'second', 'third']:
+            fn = os.path.join(self.dir, '%s.yaml' % name)
+            with open(fn, 'w') as f:
+                f.write(schema.replace('com.example.cassandra', 'com.example.%s' % name))
+            self.files.append(fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _run(self, out, *args):
+        ccgen._main(list(args) + [
+            '--java', os.path.join(self.dir, out, 'java'),
+            '--cql', os.path.join(self.dir, out, 'cql', '{name}.cql')] + self.files)
+
+    def _contents(self, out):
+        result = {}
+        for directory, _, names in os.walk(os.path.join(self.dir, out)):
+            for name in names:
+                with open(os.path.join(directory, name), 'r') as f:
+                    result[os.path.relpath(os.path.join(directory, name), self.dir).split(os.sep, 1)[1]] = f.read()
+        return result
+
+    def test_parallel_output_equals_serial_output(self):
+        self._run('serial')
+        self._run('parallel', '--jobs', '3')
+
+        self.assertEqual(21, len(self._contents('serial')))
+        self.assertEqual(self._contents('serial'), self._contents('parallel'))
+
+    def test_conflicting_outputs_are_reported(self):
+        with self.assertRaises(SystemExit):
+            ccgen._main(['--jobs', '2', '--java', os.path.join(self.dir, 'java'), '--cql', os.path.join(self.dir, 'create-tables.cql')] + self.files)
+
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'create-tables.cql')))